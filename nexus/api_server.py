@@ -1,20 +1,32 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import os
 from dotenv import load_dotenv
-from graph_db.neo4j_client import Neo4jClient
-from rag.rag_pipeline import rag_query
+from fastapi.concurrency import run_in_threadpool
+from graph_db.async_neo4j_client import AsyncNeo4jClient
+from graph_db.query_cache import QueryCache
+from graph_db.queries import (CARRIER_DELAYS_QUERY, HIGH_DEMAND_QUERY, KPI_QUERY, LOW_STOCK_QUERY,
+                              SUPPLIER_PERFORMANCE_QUERY)
+from rag.rag_pipeline import rag_query, rag_query_stream
+from rag.stats_store import stats_store
 import pandas as pd
 import json
 from flask import Flask, jsonify, send_file
 from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="INTELLIA API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await neo4j_client.close()
+
+app = FastAPI(title="INTELLIA API", version="1.0.0", lifespan=lifespan)
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 
 # Configure CORS for Next.js frontend
@@ -26,12 +38,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Neo4j client
+# Initialize Neo4j client (async, so slow queries do not block the event loop)
 NEO4J_URI = os.getenv('NEO4J_URI')
 NEO4J_USER = os.getenv('NEO4J_USER')
 NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD')
 
-neo4j_client = Neo4jClient(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+# Dashboard queries are served from cache until ingestion bumps the graph generation
+query_cache = QueryCache(ttl=float(os.getenv('QUERY_CACHE_TTL', '300')),
+                         max_bytes=int(float(os.getenv('QUERY_CACHE_MAX_MB', '64')) * 2**20))
+neo4j_client = AsyncNeo4jClient(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD, cache=query_cache)
 
 # Pydantic models
 class QueryRequest(BaseModel):
@@ -76,30 +91,33 @@ async def root():
 async def process_query(request: QueryRequest):
     """Process NLP queries using RAG pipeline"""
     try:
-        result = rag_query(request.query)
+        # rag_query is synchronous (embedding, graph and LLM calls), keep it off the event loop
+        result = await run_in_threadpool(rag_query, request.query)
         return QueryResponse(result=result, sources=[])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query processing failed: {str(e)}")
 
+@app.post("/api/query/stream")
+async def stream_query(request: QueryRequest):
+    """Stream a RAG answer as server-sent events: retrieval metadata first, then LLM tokens"""
+    def events():
+        for event, data in rag_query_stream(request.query):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    # The sync generator is iterated on the threadpool by StreamingResponse
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/api/kpis", response_model=KPIResponse)
 async def get_kpis():
     """Get KPI data from Neo4j"""
     try:
-        # Total shipments
-        shipments_result = neo4j_client.query("MATCH (i:Item)-[:SHIPPED_VIA]->(c:Carrier) RETURN count(*) as count")
-        total_shipments = shipments_result[0]['count'] if shipments_result else 0
-        
-        # Delayed shipments
-        delayed_result = neo4j_client.query("MATCH (i:Item)-[r:SHIPPED_VIA]->(c:Carrier) WHERE r.delayed = true RETURN count(*) as count")
-        delayed_shipments = delayed_result[0]['count'] if delayed_result else 0
-        
-        # Low stock items (less than 50 units)
-        low_stock_result = neo4j_client.query("MATCH (i:Item) WHERE i.stock < 50 RETURN count(*) as count")
-        low_stock_items = low_stock_result[0]['count'] if low_stock_result else 0
-        
-        # Return rate
-        returns_result = neo4j_client.query("MATCH (i:Item)-[:RETURNED_BY]->(c:Customer) RETURN count(*) as count")
-        total_returns = returns_result[0]['count'] if returns_result else 0
+        # Shipments, delayed shipments, low stock (< 50 units) and returns in one round trip
+        kpi_result = await neo4j_client.query(KPI_QUERY)
+        kpis = kpi_result[0] if kpi_result else {}
+        total_shipments = kpis.get('total_shipments', 0)
+        delayed_shipments = kpis.get('delayed_shipments', 0)
+        low_stock_items = kpis.get('low_stock_items', 0)
+        total_returns = kpis.get('total_returns', 0)
         return_rate = (total_returns / total_shipments * 100) if total_shipments > 0 else 0
         
         return KPIResponse(
@@ -113,28 +131,21 @@ async def get_kpis():
 
 @app.get("/api/charts", response_model=ChartData)
 async def get_chart_data():
-    """Get chart data from Neo4j"""
+    """Get chart data from the precomputed statistics store"""
     try:
+        stats = await run_in_threadpool(stats_store.get)
+        carriers = stats['carriers']
+
         # Carrier performance data
-        carrier_perf = neo4j_client.query("""
-            MATCH (i:Item)-[r:SHIPPED_VIA]->(c:Carrier)
-            WITH c.name as carrier, 
-                 count(*) as total_shipments,
-                 sum(CASE WHEN r.delayed = true THEN 1 ELSE 0 END) as delayed_shipments
-            RETURN carrier, 
-                   round((total_shipments - delayed_shipments) * 100.0 / total_shipments) as performance
-            ORDER BY performance DESC
-        """)
-        
         carrier_performance = [
             {
-                "name": item["carrier"],
-                "performance": item["performance"],
-                "fill": f"hsl({hash(item['carrier']) % 360}, 70%, 60%)"
+                "name": carrier,
+                "performance": int(round((row["total"] - row["delayed"]) * 100.0 / row["total"])),
+                "fill": f"hsl({hash(carrier) % 360}, 70%, 60%)"
             }
-            for item in carrier_perf
+            for carrier, row in carriers.sort_values('delay_rate').iterrows()
         ]
-        
+
         # Return reasons data (simplified - using mock data for now)
         return_reasons = [
             {"month": "Jan", "damaged": 30, "wrong_item": 15, "unwanted": 20},
@@ -142,28 +153,18 @@ async def get_chart_data():
             {"month": "Mar", "damaged": 35, "wrong_item": 18, "unwanted": 30},
             {"month": "Apr", "damaged": 50, "wrong_item": 25, "unwanted": 22},
         ]
-        
+
         # Trends data (shipment delays over time)
-        trends_data = neo4j_client.query("""
-            MATCH (i:Item)-[r:SHIPPED_VIA]->(c:Carrier)
-            WITH c.name as carrier, 
-                 count(*) as total,
-                 sum(CASE WHEN r.delayed = true THEN 1 ELSE 0 END) as delayed
-            RETURN carrier, total, delayed
-            ORDER BY delayed DESC
-            LIMIT 5
-        """)
-        
         trends = [
             {
-                "carrier": item["carrier"],
-                "total": item["total"],
-                "delayed": item["delayed"],
-                "delay_rate": round((item["delayed"] / item["total"]) * 100, 1)
+                "carrier": carrier,
+                "total": int(row["total"]),
+                "delayed": int(row["delayed"]),
+                "delay_rate": float(row["delay_rate"])
             }
-            for item in trends_data
+            for carrier, row in carriers.sort_values('delayed', ascending=False).head(5).iterrows()
         ]
-        
+
         return ChartData(
             carrier_performance=carrier_performance,
             return_reasons=return_reasons,
@@ -195,22 +196,10 @@ async def get_inventory_data():
     """Get inventory data"""
     try:
         # Low stock items
-        low_stock = neo4j_client.query("""
-            MATCH (i:Item) 
-            WHERE i.stock < 50
-            RETURN i.name as name, i.stock as stock, i.predicted_demand_next_week as demand
-            ORDER BY i.stock ASC
-            LIMIT 10
-        """)
+        low_stock = await neo4j_client.query(LOW_STOCK_QUERY)
         
         # High demand items
-        high_demand = neo4j_client.query("""
-            MATCH (i:Item) 
-            WHERE i.predicted_demand_next_week > i.stock
-            RETURN i.name as name, i.stock as stock, i.predicted_demand_next_week as demand
-            ORDER BY (i.predicted_demand_next_week - i.stock) DESC
-            LIMIT 10
-        """)
+        high_demand = await neo4j_client.query(HIGH_DEMAND_QUERY)
         
         return {
             "low_stock_items": low_stock,
@@ -224,13 +213,7 @@ async def get_suppliers_data():
     """Get suppliers data"""
     try:
         # Supplier performance
-        suppliers = neo4j_client.query("""
-            MATCH (s:Supplier)
-            OPTIONAL MATCH (i:Item)-[:SUPPLIED_BY]->(s)
-            WITH s, count(i) as item_count
-            RETURN s.name as name, s.on_time_rate as on_time_rate, s.return_rate as return_rate, item_count
-            ORDER BY s.on_time_rate DESC
-        """)
+        suppliers = await neo4j_client.query(SUPPLIER_PERFORMANCE_QUERY)
         
         return {"suppliers": suppliers}
     except Exception as e:
@@ -241,13 +224,7 @@ async def get_logistics_data():
     """Get logistics data"""
     try:
         # Carrier delays
-        delays = neo4j_client.query("""
-            MATCH (i:Item)-[r:SHIPPED_VIA]->(c:Carrier)
-            WHERE r.delayed = true
-            WITH c.name as carrier, count(*) as delay_count, collect(r.reason) as reasons
-            RETURN carrier, delay_count, reasons
-            ORDER BY delay_count DESC
-        """)
+        delays = await neo4j_client.query(CARRIER_DELAYS_QUERY)
         
         return {"delays": delays}
     except Exception as e:
@@ -258,13 +235,10 @@ async def get_returns_data():
     """Get returns data"""
     try:
         # Return reasons
-        returns = neo4j_client.query("""
-            MATCH (i:Item)-[r:RETURNED_BY]->(c:Customer)
-            WITH r.reason as reason, count(*) as count
-            RETURN reason, count
-            ORDER BY count DESC
-        """)
-        
+        stats = await run_in_threadpool(stats_store.get)
+        returns = [{"reason": reason, "count": int(count)}
+                   for reason, count in stats['return_reasons'].items()]
+
         return {"returns": returns}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch returns data: {str(e)}")
@@ -1,14 +1,24 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import os
+import json
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="INTELLIA API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    if _neo4j_client is not None:
+        await _neo4j_client.close()
+
+app = FastAPI(title="INTELLIA API", version="1.0.0", lifespan=lifespan)
 
 # Configure CORS for Next.js frontend
 app.add_middleware(
@@ -42,19 +52,45 @@ class MapData(BaseModel):
     regions: List[Dict[str, Any]]
 
 # Lazy loading functions
+_neo4j_client = None
+
 def get_neo4j_client():
-    """Lazy load Neo4j client only when needed"""
-    from graph_db.neo4j_client import Neo4jClient
-    NEO4J_URI = os.getenv('NEO4J_URI')
-    NEO4J_USER = os.getenv('NEO4J_USER')
-    NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD')
-    return Neo4jClient(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
+    """Lazy load the Neo4j client on first use and share its connection pool across requests"""
+    global _neo4j_client
+    if _neo4j_client is None:
+        from graph_db.async_neo4j_client import AsyncNeo4jClient
+        from graph_db.query_cache import QueryCache
+        NEO4J_URI = os.getenv('NEO4J_URI')
+        NEO4J_USER = os.getenv('NEO4J_USER')
+        NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD')
+        _neo4j_client = AsyncNeo4jClient(
+            NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD,
+            # Dashboard queries are served from cache until ingestion bumps the graph generation
+            cache=QueryCache(ttl=float(os.getenv('QUERY_CACHE_TTL', '300')),
+                             max_bytes=int(float(os.getenv('QUERY_CACHE_MAX_MB', '64')) * 2**20)),
+            max_connection_pool_size=int(os.getenv('NEO4J_POOL_SIZE', '50')),
+            # Seconds a request waits for a free pooled connection before failing
+            connection_acquisition_timeout=float(os.getenv('NEO4J_POOL_ACQUIRE_TIMEOUT', '30')),
+            # Connections idle longer than this are pinged before reuse
+            liveness_check_timeout=float(os.getenv('NEO4J_LIVENESS_CHECK_TIMEOUT', '60')),
+        )
+    return _neo4j_client
 
 def get_rag_query():
     """Lazy load RAG query function only when needed"""
     from rag.rag_pipeline import rag_query
     return rag_query
 
+def get_rag_query_stream():
+    """Lazy load streaming RAG query function only when needed"""
+    from rag.rag_pipeline import rag_query_stream
+    return rag_query_stream
+
+def get_stats_store():
+    """Lazy load the shared statistics store (imports pandas) only when needed"""
+    from rag.stats_store import stats_store
+    return stats_store
+
 @app.get("/")
 async def root():
     return {"message": "INTELLIA API Server", "status": "running"}
@@ -64,36 +100,43 @@ async def process_query(request: QueryRequest):
     """Process NLP queries using RAG pipeline"""
     try:
         rag_query_func = get_rag_query()
-        result = rag_query_func(request.query)
+        # rag_query is synchronous (embedding, graph and LLM calls), keep it off the event loop
+        result = await run_in_threadpool(rag_query_func, request.query)
         return QueryResponse(result=result or "No response generated", sources=[])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query processing failed: {str(e)}")
 
+@app.post("/api/query/stream")
+async def stream_query(request: QueryRequest):
+    """Stream a RAG answer as server-sent events: retrieval metadata first, then LLM tokens"""
+    try:
+        rag_query_stream = await run_in_threadpool(get_rag_query_stream)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Query processing failed: {str(e)}")
+
+    def events():
+        for event, data in rag_query_stream(request.query):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    # The sync generator is iterated on the threadpool by StreamingResponse
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/api/kpis", response_model=KPIResponse)
 async def get_kpis():
     """Get KPI data from Neo4j"""
     try:
+        from graph_db.queries import KPI_QUERY
         client = get_neo4j_client()
         
-        # Total shipments
-        shipments_result = client.query("MATCH (i:Item)-[:SHIPPED_VIA]->(c:Carrier) RETURN count(*) as count")
-        total_shipments = shipments_result[0]['count'] if shipments_result else 0
-        
-        # Delayed shipments
-        delayed_result = client.query("MATCH (i:Item)-[r:SHIPPED_VIA]->(c:Carrier) WHERE r.delayed = 'yes' RETURN count(*) as count")
-        delayed_shipments = delayed_result[0]['count'] if delayed_result else 0
-        
-        # Low stock items (less than 50 units)
-        low_stock_result = client.query("MATCH (i:Item) WHERE i.stock < 50 RETURN count(*) as count")
-        low_stock_items = low_stock_result[0]['count'] if low_stock_result else 0
-        
-        # Return rate (using actual returns data)
-        returns_result = client.query("MATCH (i:Item)-[:RETURNED_BY]->(c:Customer) RETURN count(*) as count")
-        total_returns = returns_result[0]['count'] if returns_result else 0
+        # Shipments, delayed shipments, low stock (< 50 units) and returns in one round trip
+        kpi_result = await client.query(KPI_QUERY)
+        kpis = kpi_result[0] if kpi_result else {}
+        total_shipments = kpis.get('total_shipments', 0)
+        delayed_shipments = kpis.get('delayed_shipments', 0)
+        low_stock_items = kpis.get('low_stock_items', 0)
+        total_returns = kpis.get('total_returns', 0)
         return_rate = (total_returns / total_shipments * 100) if total_shipments > 0 else 0
         
-        client.close()
-        
         return KPIResponse(
             total_shipments=total_shipments,
             delayed_shipments=delayed_shipments,
@@ -105,39 +148,21 @@ async def get_kpis():
 
 @app.get("/api/charts", response_model=ChartData)
 async def get_chart_data():
-    """Get chart data from Neo4j"""
+    """Get chart data from the precomputed statistics store"""
     try:
-        client = get_neo4j_client()
-        
+        stats = await run_in_threadpool(get_stats_store().get)
+        carriers = stats['carriers']
+
         # Carrier performance data
-        carrier_perf = client.query("""
-            MATCH (i:Item)-[r:SHIPPED_VIA]->(c:Carrier)
-            WITH c.name as carrier, 
-                 count(*) as total_shipments,
-                 sum(CASE WHEN r.delayed = 'yes' THEN 1 ELSE 0 END) as delayed_shipments
-            RETURN carrier, 
-                   round((total_shipments - delayed_shipments) * 100.0 / total_shipments) as performance
-            ORDER BY performance DESC
-        """)
-        
         carrier_performance = [
             {
-                "name": item["carrier"],
-                "performance": item["performance"],
-                "fill": f"hsl({hash(item['carrier']) % 360}, 70%, 60%)"
+                "name": carrier,
+                "performance": int(round((row["total"] - row["delayed"]) * 100.0 / row["total"])),
+                "fill": f"hsl({hash(carrier) % 360}, 70%, 60%)"
             }
-            for item in carrier_perf
+            for carrier, row in carriers.sort_values('delay_rate').iterrows()
         ]
-        
-        # Return reasons data (from actual database)
-        return_reasons_data = client.query("""
-            MATCH (i:Item)-[r:RETURNED_BY]->(c:Customer)
-            WITH r.reason as reason, count(*) as count
-            RETURN reason, count
-            ORDER BY count DESC
-            LIMIT 10
-        """)
-        
+
         # Group return reasons by month (simplified for chart display)
         return_reasons = [
             {"month": "Jan", "damaged": 0, "wrong_item": 0, "unwanted": 0},
@@ -145,42 +170,30 @@ async def get_chart_data():
             {"month": "Mar", "damaged": 0, "wrong_item": 0, "unwanted": 0},
             {"month": "Apr", "damaged": 0, "wrong_item": 0, "unwanted": 0},
         ]
-        
+
         # Map actual return reasons to chart categories
-        for item in return_reasons_data:
-            reason = item["reason"].lower()
-            count = item["count"]
-            
+        for reason, count in stats['return_reasons'].head(10).items():
+            reason = reason.lower()
+            count = int(count)
+
             if "damaged" in reason or "defective" in reason:
                 return_reasons[0]["damaged"] += count
             elif "wrong" in reason or "not as described" in reason:
                 return_reasons[0]["wrong_item"] += count
             else:
                 return_reasons[0]["unwanted"] += count
-        
+
         # Trends data (shipment delays over time)
-        trends_data = client.query("""
-            MATCH (i:Item)-[r:SHIPPED_VIA]->(c:Carrier)
-            WITH c.name as carrier, 
-                 count(*) as total,
-                 sum(CASE WHEN r.delayed = 'yes' THEN 1 ELSE 0 END) as delayed
-            RETURN carrier, total, delayed
-            ORDER BY delayed DESC
-            LIMIT 5
-        """)
-        
         trends = [
             {
-                "carrier": item["carrier"],
-                "total": item["total"],
-                "delayed": item["delayed"],
-                "delay_rate": round((item["delayed"] / item["total"]) * 100, 1)
+                "carrier": carrier,
+                "total": int(row["total"]),
+                "delayed": int(row["delayed"]),
+                "delay_rate": float(row["delay_rate"])
             }
-            for item in trends_data
+            for carrier, row in carriers.sort_values('delayed', ascending=False).head(5).iterrows()
         ]
-        
-        client.close()
-        
+
         return ChartData(
             carrier_performance=carrier_performance,
             return_reasons=return_reasons,
@@ -211,27 +224,14 @@ async def get_map_data():
 async def get_inventory_data():
     """Get inventory data"""
     try:
+        from graph_db.queries import LOW_STOCK_QUERY, HIGH_DEMAND_QUERY
         client = get_neo4j_client()
         
         # Low stock items
-        low_stock = client.query("""
-            MATCH (i:Item) 
-            WHERE i.stock < 50
-            RETURN i.name as name, i.stock as stock, i.predicted_demand_next_week as demand
-            ORDER BY i.stock ASC
-            LIMIT 10
-        """)
+        low_stock = await client.query(LOW_STOCK_QUERY)
         
         # High demand items
-        high_demand = client.query("""
-            MATCH (i:Item) 
-            WHERE i.predicted_demand_next_week > i.stock
-            RETURN i.name as name, i.stock as stock, i.predicted_demand_next_week as demand
-            ORDER BY (i.predicted_demand_next_week - i.stock) DESC
-            LIMIT 10
-        """)
-        
-        client.close()
+        high_demand = await client.query(HIGH_DEMAND_QUERY)
         
         return {
             "low_stock_items": low_stock,
@@ -244,18 +244,11 @@ async def get_inventory_data():
 async def get_suppliers_data():
     """Get suppliers data"""
     try:
+        from graph_db.queries import SUPPLIER_PERFORMANCE_QUERY
         client = get_neo4j_client()
         
         # Supplier performance
-        suppliers = client.query("""
-            MATCH (s:Supplier)
-            OPTIONAL MATCH (i:Item)-[:SUPPLIED_BY]->(s)
-            WITH s, count(i) as item_count
-            RETURN s.name as name, s.on_time_rate as on_time_rate, s.return_rate as return_rate, item_count
-            ORDER BY s.on_time_rate DESC
-        """)
-        
-        client.close()
+        suppliers = await client.query(SUPPLIER_PERFORMANCE_QUERY)
         
         return {"suppliers": suppliers}
     except Exception as e:
@@ -265,18 +258,11 @@ async def get_suppliers_data():
 async def get_logistics_data():
     """Get logistics data"""
     try:
+        from graph_db.queries import CARRIER_DELAYS_QUERY
         client = get_neo4j_client()
         
         # Carrier delays
-        delays = client.query("""
-            MATCH (i:Item)-[r:SHIPPED_VIA]->(c:Carrier)
-            WHERE r.delayed = true
-            WITH c.name as carrier, count(*) as delay_count, collect(r.reason) as reasons
-            RETURN carrier, delay_count, reasons
-            ORDER BY delay_count DESC
-        """)
-        
-        client.close()
+        delays = await client.query(CARRIER_DELAYS_QUERY)
         
         return {"delays": delays}
     except Exception as e:
@@ -286,18 +272,11 @@ async def get_logistics_data():
 async def get_returns_data():
     """Get returns data"""
     try:
-        client = get_neo4j_client()
-        
         # Return reasons
-        returns = client.query("""
-            MATCH (i:Item)-[r:RETURNED_BY]->(c:Customer)
-            WITH r.reason as reason, count(*) as count
-            RETURN reason, count
-            ORDER BY count DESC
-        """)
-        
-        client.close()
-        
+        stats = await run_in_threadpool(get_stats_store().get)
+        returns = [{"reason": reason, "count": int(count)}
+                   for reason, count in stats['return_reasons'].items()]
+
         return {"returns": returns}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch returns data: {str(e)}")
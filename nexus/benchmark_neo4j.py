@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Benchmarks against a running Neo4j (NEO4J_URI / NEO4J_USER / NEO4J_PASSWORD).
+WARNING: ingestion benchmarks wipe the target database.
+
+Usage:
+    python benchmark_neo4j.py ingest --rows 5000 --batch-sizes 100 1000 5000
+    python benchmark_neo4j.py ingest --rows 50000 --batch-sizes 1000 --workers 1 3 --skip-rowwise
+    python benchmark_neo4j.py concurrency --concurrency 1 4 16 --loads 20
+    python benchmark_neo4j.py kpis --repeats 50
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from generate_large_dataset import (generate_inventory_data, generate_suppliers_data,
+                                    generate_logistics_data, generate_returns_data)
+from graph_db.async_neo4j_client import AsyncNeo4jClient
+from graph_db.neo4j_client import Neo4jClient
+from graph_db.queries import KPI_QUERY
+
+load_dotenv()
+
+
+def make_client():
+    return Neo4jClient(os.getenv('NEO4J_URI'), os.getenv('NEO4J_USER'), os.getenv('NEO4J_PASSWORD'))
+
+
+def write_dataset(directory, rows):
+    """Synthetic CSVs with the same schema as data/; returns the four paths in load order"""
+    paths = []
+    for name, generate in [('inventory', generate_inventory_data), ('suppliers', generate_suppliers_data),
+                           ('logistics', generate_logistics_data), ('returns', generate_returns_data)]:
+        path = os.path.join(directory, f'{name}.csv')
+        generate(rows).to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def ingest_rowwise(client, inventory_path, suppliers_path, logistics_path, returns_path):
+    """The previous ingestion: auto-commit session.run calls per CSV row"""
+    stats = {}
+    client.reset_graph(progress=None)
+    with client.driver.session() as session:
+        start = time.perf_counter()
+        inventory = pd.read_csv(inventory_path)
+        for _, row in inventory.iterrows():
+            session.run(
+                "CREATE (i:Item {item_id: $item_id, name: $name, stock: $stock, warehouse_id: $warehouse_id, predicted_demand: $demand})",
+                {"item_id": str(row['item_id']), "name": row['item_name'], "stock": int(row['stock']), "warehouse_id": row['warehouse_id'], "demand": int(row['predicted_demand_next_week'])}
+            )
+        stats['inventory'] = (len(inventory), time.perf_counter() - start)
+
+        start = time.perf_counter()
+        suppliers = pd.read_csv(suppliers_path)
+        for _, row in suppliers.iterrows():
+            session.run(
+                "MERGE (s:Supplier {supplier_id: $supplier_id, name: $name, on_time_rate: $on_time, return_rate: $return_rate})",
+                {"supplier_id": row['supplier_id'], "name": row['supplier_name'], "on_time": float(row['on_time_rate']), "return_rate": float(row['return_rate'])}
+            )
+            session.run(
+                "MATCH (i:Item {item_id: $item_id}), (s:Supplier {supplier_id: $supplier_id}) CREATE (i)-[:SUPPLIED_BY]->(s)",
+                {"item_id": str(row['item_id']), "supplier_id": row['supplier_id']}
+            )
+        stats['suppliers'] = (len(suppliers), time.perf_counter() - start)
+
+        start = time.perf_counter()
+        logistics = pd.read_csv(logistics_path)
+        for _, row in logistics.iterrows():
+            session.run("MERGE (c:Carrier {name: $carrier})", {"carrier": row['carrier']})
+            session.run(
+                "MATCH (i:Item {item_id: $item_id}), (c:Carrier {name: $carrier}) CREATE (i)-[:SHIPPED_VIA {delayed: $delayed, reason: $reason}]->(c)",
+                {"item_id": str(row['item_id']), "carrier": row['carrier'], "delayed": row['delayed'], "reason": row['delay_reason']}
+            )
+        stats['logistics'] = (len(logistics), time.perf_counter() - start)
+
+        start = time.perf_counter()
+        returns = pd.read_csv(returns_path)
+        for _, row in returns.iterrows():
+            session.run("MERGE (c:Customer {customer_id: $customer_id})", {"customer_id": row['customer_id']})
+            session.run(
+                "MATCH (i:Item {item_id: $item_id}), (c:Customer {customer_id: $customer_id}) CREATE (i)-[:RETURNED_BY {reason: $reason, date: $date}]->(c)",
+                {"item_id": str(row['item_id']), "customer_id": row['customer_id'], "reason": row['return_reason'], "date": row['date']}
+            )
+        stats['returns'] = (len(returns), time.perf_counter() - start)
+    return stats
+
+
+def print_ingest(label, stats, wall_s=None):
+    total_rows = sum(rows for rows, _ in stats.values())
+    # Tables overlap when loaded in parallel, so use the wall-clock time when given
+    total_s = wall_s if wall_s is not None else sum(seconds for _, seconds in stats.values())
+    cells = ''.join(f"{rows / seconds if seconds else 0:>12.0f}" for rows, seconds in stats.values())
+    print(f"{label:<16}{cells}{total_s:>10.2f}{total_rows / total_s if total_s else 0:>12.0f}")
+
+
+def bench_ingest(args):
+    client = make_client()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = write_dataset(tmp, args.rows)
+            print(f"📦 {args.rows} rows per table")
+            print(f"{'method':<16}" + ''.join(f"{t + ' r/s':>12}" for t in ('inventory', 'suppliers', 'logistics', 'returns'))
+                  + f"{'total s':>10}{'total r/s':>12}")
+            if not args.skip_rowwise:
+                print_ingest('row-by-row', ingest_rowwise(client, *paths))
+            for batch_size in args.batch_sizes:
+                for workers in args.workers:
+                    start = time.perf_counter()
+                    stats = client.create_graph_from_csvs(*paths, batch_size=batch_size, workers=workers, progress=None)
+                    wall_s = time.perf_counter() - start
+                    print_ingest(f'unwind {batch_size} x{workers}',
+                                 {t: (s['rows'], s['seconds']) for t, s in stats.items()}, wall_s)
+    finally:
+        client.close()
+
+
+# The Cypher one dashboard page load issues across /api/kpis, /api/charts,
+# /api/inventory, /api/suppliers and /api/returns
+DASHBOARD_QUERIES = [
+    "MATCH (i:Item)-[:SHIPPED_VIA]->(c:Carrier) RETURN count(*) as count",
+    "MATCH (i:Item)-[r:SHIPPED_VIA]->(c:Carrier) WHERE r.delayed = 'yes' RETURN count(*) as count",
+    "MATCH (i:Item) WHERE i.stock < 50 RETURN count(*) as count",
+    "MATCH (i:Item)-[:RETURNED_BY]->(c:Customer) RETURN count(*) as count",
+    """MATCH (i:Item)-[r:SHIPPED_VIA]->(c:Carrier)
+       WITH c.name as carrier, count(*) as total_shipments,
+            sum(CASE WHEN r.delayed = 'yes' THEN 1 ELSE 0 END) as delayed_shipments
+       RETURN carrier, round((total_shipments - delayed_shipments) * 100.0 / total_shipments) as performance
+       ORDER BY performance DESC""",
+    """MATCH (i:Item)-[r:RETURNED_BY]->(c:Customer)
+       WITH r.reason as reason, count(*) as count RETURN reason, count ORDER BY count DESC LIMIT 10""",
+    """MATCH (i:Item) WHERE i.stock < 50
+       RETURN i.name as name, i.stock as stock ORDER BY i.stock ASC LIMIT 10""",
+    """MATCH (s:Supplier) OPTIONAL MATCH (i:Item)-[:SUPPLIED_BY]->(s)
+       WITH s, count(i) as item_count
+       RETURN s.name as name, s.on_time_rate as on_time_rate, s.return_rate as return_rate, item_count
+       ORDER BY s.on_time_rate DESC""",
+]
+
+
+async def run_loads(load, concurrency, loads):
+    """Run `loads` dashboard loads from each of `concurrency` coroutines; returns (wall s, latencies ms)"""
+    latencies = []
+
+    async def worker():
+        for _ in range(loads):
+            start = time.perf_counter()
+            await load()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, sorted(latencies)
+
+
+async def concurrency_bench(args):
+    sync_client = make_client()
+    async_client = AsyncNeo4jClient(os.getenv('NEO4J_URI'), os.getenv('NEO4J_USER'), os.getenv('NEO4J_PASSWORD'))
+
+    async def blocking_load():
+        # What the handlers did before: sync driver calls on the event loop
+        for cypher_query in DASHBOARD_QUERIES:
+            sync_client.query(cypher_query)
+
+    async def async_load():
+        for cypher_query in DASHBOARD_QUERIES:
+            await async_client.query(cypher_query)
+
+    try:
+        await async_load()
+        print(f"{'client':<10}{'parallel':>9}{'loads/s':>10}{'p50 ms':>9}{'p95 ms':>9}")
+        for concurrency in args.concurrency:
+            for name, load in [('blocking', blocking_load), ('async', async_load)]:
+                wall_s, latencies = await run_loads(load, concurrency, args.loads)
+                p50 = latencies[len(latencies) // 2]
+                p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+                print(f"{name:<10}{concurrency:>9}{len(latencies) / wall_s:>10.1f}{p50:>9.1f}{p95:>9.1f}")
+    finally:
+        sync_client.close()
+        await async_client.close()
+
+
+def bench_concurrency(args):
+    asyncio.run(concurrency_bench(args))
+
+
+# The four sequential KPI queries /api/kpis used to run
+SEPARATE_KPI_QUERIES = DASHBOARD_QUERIES[:4]
+
+
+def bench_kpis(args):
+    client = make_client()
+    try:
+        def separate():
+            return [client.query(q)[0]['count'] for q in SEPARATE_KPI_QUERIES]
+
+        def combined():
+            row = client.query(KPI_QUERY)[0]
+            return [row['total_shipments'], row['delayed_shipments'], row['low_stock_items'], row['total_returns']]
+
+        if separate() != combined():
+            print(f"⚠️ Results differ: {separate()} vs {combined()}")
+        print(f"{'method':<12}{'round trips':>12}{'median ms':>11}{'p95 ms':>9}")
+        for name, run, trips in [('separate', separate, len(SEPARATE_KPI_QUERIES)), ('CALL {}', combined, 1)]:
+            latencies = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                run()
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies.sort()
+            print(f"{name:<12}{trips:>12}{latencies[len(latencies) // 2]:>11.2f}"
+                  f"{latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]:>9.2f}")
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    ingest = sub.add_parser('ingest', help='row-by-row vs batched UNWIND ingestion throughput')
+    ingest.add_argument('--rows', type=int, default=2000)
+    ingest.add_argument('--batch-sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    ingest.add_argument('--workers', type=int, nargs='+', default=[1], help='worker threads for the dependent tables')
+    ingest.add_argument('--skip-rowwise', action='store_true', help='only run the UNWIND loader (for large --rows)')
+    ingest.set_defaults(func=bench_ingest)
+
+    concurrency = sub.add_parser('concurrency', help='dashboard load throughput, sync vs async client on one event loop')
+    concurrency.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    concurrency.add_argument('--loads', type=int, default=20, help='dashboard loads per concurrent client')
+    concurrency.set_defaults(func=bench_concurrency)
+
+    kpis = sub.add_parser('kpis', help='four KPI queries vs one CALL {} statement')
+    kpis.add_argument('--repeats', type=int, default=50)
+    kpis.set_defaults(func=bench_kpis)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
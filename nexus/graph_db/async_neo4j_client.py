@@ -0,0 +1,56 @@
+from neo4j import AsyncGraphDatabase
+
+from graph_db.query_cache import GENERATION_QUERY, MISS
+
+
+class AsyncNeo4jClient:
+    """asyncio counterpart of Neo4jClient for use inside async request handlers.
+
+    Each call opens its own session, so concurrent coroutines can share one
+    client; the driver's connection pool bounds how many run at once.
+    """
+
+    def __init__(self, uri, user, password, cache=None, **driver_config):
+        self.driver = AsyncGraphDatabase.driver(uri, auth=(user, password), **driver_config)
+        # Optional QueryCache for read queries
+        self.cache = cache
+
+    async def close(self):
+        await self.driver.close()
+
+    async def query(self, cypher_query, params=None, use_cache=True):
+        """Run a query and return its records as dicts (from the cache when enabled)"""
+        if self.cache is None or not use_cache:
+            return await self._query(cypher_query, params)
+        if self.cache.needs_generation_check():
+            rows = await self._query(GENERATION_QUERY)
+            self.cache.set_generation(rows[0]['generation'] if rows else None)
+        generation = self.cache.generation
+        key = self.cache.key(cypher_query, params)
+        result = self.cache.get(key)
+        if result is MISS:
+            result = await self._query(cypher_query, params)
+            self.cache.put(key, result, generation)
+        return result
+
+    async def _query(self, cypher_query, params=None):
+        async with self.driver.session() as session:
+            result = await session.run(cypher_query, params or {})
+            return [record.data() async for record in result]
+
+    async def stream(self, cypher_query, params=None, fetch_size=1000):
+        """Yield records as dicts, fetching fetch_size at a time from the server"""
+        async with self.driver.session(fetch_size=fetch_size) as session:
+            result = await session.run(cypher_query, params or {})
+            async for record in result:
+                yield record.data()
+
+    async def read_transaction(self, work, *args, **kwargs):
+        """Run `async def work(tx, ...)` in a managed read transaction (retried on transient errors)"""
+        async with self.driver.session() as session:
+            return await session.execute_read(work, *args, **kwargs)
+
+    async def write_transaction(self, work, *args, **kwargs):
+        """Run `async def work(tx, ...)` in a managed write transaction (retried on transient errors)"""
+        async with self.driver.session() as session:
+            return await session.execute_write(work, *args, **kwargs)
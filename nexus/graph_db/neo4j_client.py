@@ -1,60 +1,391 @@
 from neo4j import GraphDatabase
 import pandas as pd
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from graph_db.query_cache import BUMP_GENERATION_QUERY, GENERATION_QUERY, MISS
+from graph_db.schema import apply_schema
+from graph_db.snapshot import GraphSnapshot, row_hashes
+
+DEFAULT_BATCH_SIZE = 1000
+# Relationships/nodes removed per transaction when resetting the graph
+DEFAULT_RESET_BATCH_SIZE = 10000
+
+# One statement per table; each batch of CSV rows is sent as $rows and applied
+# in a single write transaction. Nodes are merged on their unique key (see
+# graph_db/schema.py) so every lookup is an index seek, and re-applying a row
+# updates it in place.
+ITEM_QUERY = """
+UNWIND $rows AS row
+MERGE (i:Item {item_id: row.item_id})
+SET i.name = row.name, i.stock = row.stock, i.warehouse_id = row.warehouse_id, i.predicted_demand = row.demand
+"""
+
+SUPPLIER_QUERY = """
+UNWIND $rows AS row
+MERGE (s:Supplier {supplier_id: row.supplier_id})
+SET s.name = row.name, s.on_time_rate = row.on_time, s.return_rate = row.return_rate
+WITH s, row
+OPTIONAL MATCH (:Item)-[old:SUPPLIED_BY]->(s)
+DELETE old
+WITH DISTINCT s, row
+MATCH (i:Item {item_id: row.item_id})
+MERGE (i)-[:SUPPLIED_BY]->(s)
+"""
+
+SHIPMENT_QUERY = """
+UNWIND $rows AS row
+MERGE (c:Carrier {name: row.carrier})
+WITH c, row
+MATCH (i:Item {item_id: row.item_id})
+CREATE (i)-[:SHIPPED_VIA {shipment_id: row.shipment_id, delayed: row.delayed, reason: row.reason}]->(c)
+"""
+
+RETURN_QUERY = """
+UNWIND $rows AS row
+MERGE (c:Customer {customer_id: row.customer_id})
+WITH c, row
+MATCH (i:Item {item_id: row.item_id})
+CREATE (i)-[:RETURNED_BY {return_id: row.return_id, reason: row.reason, date: row.date}]->(c)
+"""
+
+# Deletes by primary key. Carriers and customers only exist through their
+# relationships, so they go once the last one is removed.
+DELETE_ITEMS_QUERY = """
+UNWIND $keys AS key
+MATCH (i:Item {item_id: key})
+DETACH DELETE i
+"""
+
+DELETE_SUPPLIERS_QUERY = """
+UNWIND $keys AS key
+MATCH (s:Supplier {supplier_id: key})
+DETACH DELETE s
+"""
+
+DELETE_SHIPMENTS_QUERY = """
+UNWIND $keys AS key
+MATCH ()-[r:SHIPPED_VIA {shipment_id: key}]->(c:Carrier)
+DELETE r
+WITH DISTINCT c
+WHERE NOT EXISTS { (c)--() }
+DELETE c
+"""
+
+DELETE_RETURNS_QUERY = """
+UNWIND $keys AS key
+MATCH ()-[r:RETURNED_BY {return_id: key}]->(c:Customer)
+DELETE r
+WITH DISTINCT c
+WHERE NOT EXISTS { (c)--() }
+DELETE c
+"""
+
+
+def _records(df):
+    # Plain Python values for the driver; missing CSV cells become null
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def inventory_rows(df):
+    return _records(pd.DataFrame({
+        'item_id': df['item_id'].astype(str),
+        'name': df['item_name'],
+        'stock': df['stock'].astype(int),
+        'warehouse_id': df['warehouse_id'],
+        'demand': df['predicted_demand_next_week'].astype(int),
+    }))
+
+
+def supplier_rows(df):
+    return _records(pd.DataFrame({
+        'supplier_id': df['supplier_id'],
+        'name': df['supplier_name'],
+        'item_id': df['item_id'].astype(str),
+        'on_time': df['on_time_rate'].astype(float),
+        'return_rate': df['return_rate'].astype(float),
+    }))
+
+
+def shipment_rows(df):
+    return _records(pd.DataFrame({
+        'shipment_id': df['shipment_id'],
+        'item_id': df['item_id'].astype(str),
+        'carrier': df['carrier'],
+        'delayed': df['delayed'],
+        'reason': df['delay_reason'],
+    }))
+
+
+def return_rows(df):
+    return _records(pd.DataFrame({
+        'return_id': df['return_id'],
+        'item_id': df['item_id'].astype(str),
+        'customer_id': df['customer_id'],
+        'reason': df['return_reason'],
+        'date': df['date'],
+    }))
+
+
+# Relationships go first so no single DETACH DELETE has to hold a high-degree
+# node's (e.g. a carrier's) relationships in one transaction. The generation
+# counter survives the reset.
+DELETE_RELATIONSHIPS_BATCH = """
+MATCH ()-[r]->()
+WITH r LIMIT $limit
+DELETE r
+RETURN count(*) AS deleted
+"""
+
+DELETE_NODES_BATCH = """
+MATCH (n) WHERE NOT n:GraphMeta
+WITH n LIMIT $limit
+DETACH DELETE n
+RETURN count(*) AS deleted
+"""
+
+
+def _print_progress(kind, done, total):
+    print(f"  Reset: {done}/{total} {kind} deleted")
+
+
+# (name, primary key column, row builder, load query, delete query, replace).
+# Items come first since the other tables link to them. Relationship tables
+# have no node to merge on, so a changed row is deleted and re-created
+# (replace=True) in the same transaction.
+GRAPH_TABLES = [
+    ('inventory', 'item_id', inventory_rows, ITEM_QUERY, DELETE_ITEMS_QUERY, False),
+    ('suppliers', 'supplier_id', supplier_rows, SUPPLIER_QUERY, DELETE_SUPPLIERS_QUERY, False),
+    ('logistics', 'shipment_id', shipment_rows, SHIPMENT_QUERY, DELETE_SHIPMENTS_QUERY, True),
+    ('returns', 'return_id', return_rows, RETURN_QUERY, DELETE_RETURNS_QUERY, True),
+]
+
+
+def _read_csv(path, batch_size):
+    # Read as text so row hashes do not depend on per-chunk dtype inference
+    return pd.read_csv(path, chunksize=batch_size, dtype=str)
+
+
+def _concat_hashes(hashes):
+    return pd.concat(hashes) if hashes else pd.Series([], dtype='uint64', name='hash', index=pd.Index([], name='key'))
+
 
 class Neo4jClient:
-    def __init__(self, uri, user, password):
+    def __init__(self, uri, user, password, cache=None):
         self.driver = GraphDatabase.driver(uri, auth=(user, password))
+        # Optional QueryCache for read queries
+        self.cache = cache
 
     def close(self):
         self.driver.close()
 
-    def create_graph_from_csvs(self, inventory_path, suppliers_path, logistics_path, returns_path):
+    @staticmethod
+    def _write_batch(tx, cypher, rows, delete_query=None, keys=None):
+        if delete_query:
+            tx.run(delete_query, keys=keys).consume()
+        tx.run(cypher, rows=rows).consume()
+
+    @staticmethod
+    def _delete_batch(tx, delete_query, keys):
+        tx.run(delete_query, keys=keys).consume()
+
+    @staticmethod
+    def _delete_limited(tx, delete_query, limit):
+        return tx.run(delete_query, limit=limit).single()['deleted']
+
+    def reset_graph(self, batch_size=DEFAULT_RESET_BATCH_SIZE, progress=_print_progress):
+        """Delete every relationship and node in transactions of at most batch_size.
+
+        progress(kind, done, total) is called after each batch (pass None to
+        silence it). Returns (relationships deleted, nodes deleted).
+        """
+        deleted = {}
         with self.driver.session() as session:
-            # Clear existing data
-            session.run("MATCH (n) DETACH DELETE n")
-            # Inventory
-            inventory = pd.read_csv(inventory_path)
-            for _, row in inventory.iterrows():
-                session.run(
-                    "CREATE (i:Item {item_id: $item_id, name: $name, stock: $stock, warehouse_id: $warehouse_id, predicted_demand: $demand})",
-                    {"item_id": str(row['item_id']), "name": row['item_name'], "stock": int(row['stock']), "warehouse_id": row['warehouse_id'], "demand": int(row['predicted_demand_next_week'])}
-                )
-            # Suppliers
-            suppliers = pd.read_csv(suppliers_path)
-            for _, row in suppliers.iterrows():
-                session.run(
-                    "MERGE (s:Supplier {supplier_id: $supplier_id, name: $name, on_time_rate: $on_time, return_rate: $return_rate})",
-                    {"supplier_id": row['supplier_id'], "name": row['supplier_name'], "on_time": float(row['on_time_rate']), "return_rate": float(row['return_rate'])}
-                )
-                session.run(
-                    "MATCH (i:Item {item_id: $item_id}), (s:Supplier {supplier_id: $supplier_id}) CREATE (i)-[:SUPPLIED_BY]->(s)",
-                    {"item_id": str(row['item_id']), "supplier_id": row['supplier_id']}
-                )
-            # Logistics
-            logistics = pd.read_csv(logistics_path)
-            for _, row in logistics.iterrows():
-                session.run(
-                    "MERGE (c:Carrier {name: $carrier})",
-                    {"carrier": row['carrier']}
-                )
-                session.run(
-                    "MATCH (i:Item {item_id: $item_id}), (c:Carrier {name: $carrier}) CREATE (i)-[:SHIPPED_VIA {delayed: $delayed, reason: $reason}]->(c)",
-                    {"item_id": str(row['item_id']), "carrier": row['carrier'], "delayed": row['delayed'], "reason": row['delay_reason']}
-                )
-            # Returns
-            returns = pd.read_csv(returns_path)
-            for _, row in returns.iterrows():
-                session.run(
-                    "MERGE (c:Customer {customer_id: $customer_id})",
-                    {"customer_id": row['customer_id']}
-                )
-                session.run(
-                    "MATCH (i:Item {item_id: $item_id}), (c:Customer {customer_id: $customer_id}) CREATE (i)-[:RETURNED_BY {reason: $reason, date: $date}]->(c)",
-                    {"item_id": str(row['item_id']), "customer_id": row['customer_id'], "reason": row['return_reason'], "date": row['date']}
-                )
-
-    def query(self, cypher_query, params=None):
+            for kind, count_query, delete_query in [
+                ('relationships', "MATCH ()-[r]->() RETURN count(r) AS total", DELETE_RELATIONSHIPS_BATCH),
+                ('nodes', "MATCH (n) WHERE NOT n:GraphMeta RETURN count(n) AS total", DELETE_NODES_BATCH),
+            ]:
+                total = session.run(count_query).single()['total']
+                done = 0
+                while True:
+                    batch = session.execute_write(self._delete_limited, delete_query, batch_size)
+                    done += batch
+                    if progress:
+                        progress(kind, done, max(total, done))
+                    if batch < batch_size:
+                        break
+                deleted[kind] = done
+        return deleted['relationships'], deleted['nodes']
+
+    def _run_tables(self, apply_table, paths, workers):
+        """Run apply_table(table, path) for every table; returns {name: result}.
+
+        Items are loaded first. With workers > 1 the supplier, carrier and
+        customer subgraphs then load concurrently, each on its own session.
+        """
+        inventory, *dependents = list(zip(GRAPH_TABLES, paths))
+        results = {inventory[0][0]: apply_table(*inventory)}
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {table[0]: pool.submit(apply_table, table, path) for table, path in dependents}
+                results.update({name: future.result() for name, future in futures.items()})
+        else:
+            for table, path in dependents:
+                results[table[0]] = apply_table(table, path)
+        return results
+
+    def load_table(self, table, path, batch_size=DEFAULT_BATCH_SIZE):
+        """Apply a table's load query to a CSV in UNWIND batches; returns (rows, seconds, row hashes)"""
+        name, key, to_rows, cypher, _, _ = table
+        start = time.perf_counter()
+        count = 0
+        hashes = []
+        with self.driver.session() as session:
+            for chunk in _read_csv(path, batch_size):
+                # Rows touch Item nodes in item_id order, so concurrent tables
+                # lock shared items in the same order instead of deadlocking.
+                # Transient lock errors are retried by execute_write.
+                rows = to_rows(chunk.sort_values('item_id', kind='stable'))
+                session.execute_write(self._write_batch, cypher, rows)
+                hashes.append(row_hashes(chunk, key))
+                count += len(rows)
+        return count, time.perf_counter() - start, _concat_hashes(hashes)
+
+    def create_graph_from_csvs(self, inventory_path, suppliers_path, logistics_path, returns_path,
+                               batch_size=DEFAULT_BATCH_SIZE, snapshot_dir=None, workers=1, progress=_print_progress):
+        """Rebuild the graph from the CSVs.
+
+        If snapshot_dir is given, the loaded rows are recorded there for
+        later update_graph_from_csvs() calls. workers > 1 loads the tables
+        that depend on items in parallel. progress reports the batched reset
+        (see reset_graph). Returns
+        {table: {'rows', 'seconds', 'rows_per_sec'}} for each table.
+        """
+        paths = [inventory_path, suppliers_path, logistics_path, returns_path]
+        snapshot = GraphSnapshot(snapshot_dir) if snapshot_dir else None
+        if snapshot:
+            # An interrupted reload must not leave a snapshot of the old graph behind
+            snapshot.clear()
+        # Clear existing data
+        self.reset_graph(progress=progress)
+        # Constraints and indexes survive the clear; only missing ones are created
+        apply_schema(self)
+
+        def apply_table(table, path):
+            rows, seconds, hashes = self.load_table(table, path, batch_size)
+            if snapshot:
+                snapshot.save(table[0], hashes)
+            return {'rows': rows, 'seconds': seconds, 'rows_per_sec': rows / seconds if seconds else 0.0}
+
+        stats = self._run_tables(apply_table, paths, workers)
+        self.bump_generation()
+        return stats
+
+    def update_table(self, table, path, snapshot, created_items=(), batch_size=DEFAULT_BATCH_SIZE):
+        """Apply one table's changes since its snapshot; returns (counts, created keys)"""
+        name, key, to_rows, cypher, delete_query, replace = table
+        start = time.perf_counter()
+        previous = snapshot.load(name)
+        counts = {'created': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+        created = []
+        seen = []
         with self.driver.session() as session:
+            for chunk in _read_csv(path, batch_size):
+                hashes = row_hashes(chunk, key)
+                seen.append(hashes)
+                known = hashes.index.isin(previous.index)
+                apply = ~known
+                apply[known] = previous.reindex(hashes.index[known]).values != hashes.values[known]
+                created.extend(hashes.index[~known])
+                if created_items:
+                    # Re-apply rows pointing at a newly created item, since
+                    # their relationship could not be created while it was missing
+                    apply |= chunk['item_id'].isin(created_items).values
+                counts['created'] += int((~known).sum())
+                counts['updated'] += int((apply & known).sum())
+                counts['unchanged'] += int((~apply).sum())
+                if apply.any():
+                    changed = chunk[apply].sort_values('item_id', kind='stable')
+                    session.execute_write(self._write_batch, cypher, to_rows(changed),
+                                          delete_query if replace else None, changed[key].tolist())
+
+            current = _concat_hashes(seen)
+            removed = previous.index.difference(current.index).tolist()
+            for s in range(0, len(removed), batch_size):
+                session.execute_write(self._delete_batch, delete_query, removed[s:s + batch_size])
+        counts['deleted'] = len(removed)
+        snapshot.save(name, current)
+        counts['seconds'] = time.perf_counter() - start
+        return counts, created
+
+    def update_graph_from_csvs(self, inventory_path, suppliers_path, logistics_path, returns_path,
+                               snapshot_dir, batch_size=DEFAULT_BATCH_SIZE, workers=1):
+        """Apply only the rows that changed since the last ingestion.
+
+        Rows are diffed against the snapshot in snapshot_dir by primary key
+        and row hash; new and changed rows are merged, rows that disappeared
+        are deleted, and the rest of the graph is left untouched. Falls back
+        to a full create_graph_from_csvs() when there is no snapshot yet.
+        Returns {table: {'created', 'updated', 'deleted', 'unchanged', 'seconds'}}.
+        """
+        paths = [inventory_path, suppliers_path, logistics_path, returns_path]
+        snapshot = GraphSnapshot(snapshot_dir)
+        if not snapshot.exists([name for name, *_ in GRAPH_TABLES]):
+            print("No graph snapshot found, running a full load.")
+            full = self.create_graph_from_csvs(*paths, batch_size=batch_size, snapshot_dir=snapshot_dir, workers=workers)
+            return {name: {'created': s['rows'], 'updated': 0, 'deleted': 0, 'unchanged': 0, 'seconds': s['seconds']}
+                    for name, s in full.items()}
+
+        apply_schema(self)
+        created_items = set()
+
+        def apply_table(table, path):
+            counts, created = self.update_table(table, path, snapshot, created_items, batch_size)
+            if table[0] == 'inventory':
+                # Read-only from here on, once the dependent tables start
+                created_items.update(created)
+            return counts
+
+        stats = self._run_tables(apply_table, paths, workers)
+        self.bump_generation()
+        return stats
+
+    def bump_generation(self):
+        """Mark the graph as changed so cached query results everywhere are dropped"""
+        with self.driver.session() as session:
+            generation = session.execute_write(lambda tx: tx.run(BUMP_GENERATION_QUERY).single()['generation'])
+        if self.cache is not None:
+            self.cache.set_generation(generation)
+        return generation
+
+    def query(self, cypher_query, params=None, use_cache=True):
+        """Run a query and return its records as dicts (from the cache when enabled)"""
+        if self.cache is None or not use_cache:
+            return self._query(cypher_query, params)
+        if self.cache.needs_generation_check():
+            rows = self._query(GENERATION_QUERY)
+            self.cache.set_generation(rows[0]['generation'] if rows else None)
+        generation = self.cache.generation
+        key = self.cache.key(cypher_query, params)
+        result = self.cache.get(key)
+        if result is MISS:
+            result = self._query(cypher_query, params)
+            self.cache.put(key, result, generation)
+        return result
+
+    def _query(self, cypher_query, params=None):
+        with self.driver.session() as session:
+            result = session.run(cypher_query, params or {})
+            return [record.data() for record in result]
+
+    def stream(self, cypher_query, params=None, fetch_size=1000):
+        """Yield records as dicts, pulling fetch_size at a time from the server.
+
+        Memory stays bounded by fetch_size however large the result is. The
+        session stays open until the generator is exhausted or closed.
+        """
+        with self.driver.session(fetch_size=fetch_size) as session:
             result = session.run(cypher_query, params or {})
-            return [record.data() for record in result] 
\ No newline at end of file
+            for record in result:
+                yield record.data()
@@ -0,0 +1,63 @@
+# Read queries issued by the API servers and the RAG pipeline. They live here
+# so graph_db/schema.py can EXPLAIN the exact statements that are served.
+
+# All dashboard KPIs in one round trip. Each subquery is answered from the
+# count store or an index (graph_db/schema.py) rather than a graph scan.
+KPI_QUERY = """
+CALL { MATCH ()-[:SHIPPED_VIA]->() RETURN count(*) AS total_shipments }
+CALL { MATCH ()-[r:SHIPPED_VIA]->() WHERE r.delayed = 'yes' RETURN count(*) AS delayed_shipments }
+CALL { MATCH (i:Item) WHERE i.stock < 50 RETURN count(*) AS low_stock_items }
+CALL { MATCH ()-[:RETURNED_BY]->() RETURN count(*) AS total_returns }
+RETURN total_shipments, delayed_shipments, low_stock_items, total_returns
+"""
+
+# /api/inventory
+LOW_STOCK_QUERY = """
+MATCH (i:Item)
+WHERE i.stock < 50
+RETURN i.name as name, i.stock as stock, i.predicted_demand_next_week as demand
+ORDER BY i.stock ASC
+LIMIT 10
+"""
+
+# Compares two properties of every item, so it is a label scan by design
+HIGH_DEMAND_QUERY = """
+MATCH (i:Item)
+WHERE i.predicted_demand_next_week > i.stock
+RETURN i.name as name, i.stock as stock, i.predicted_demand_next_week as demand
+ORDER BY (i.predicted_demand_next_week - i.stock) DESC
+LIMIT 10
+"""
+
+# /api/suppliers lists every supplier, so it is a label scan by design
+SUPPLIER_PERFORMANCE_QUERY = """
+MATCH (s:Supplier)
+OPTIONAL MATCH (i:Item)-[:SUPPLIED_BY]->(s)
+WITH s, count(i) as item_count
+RETURN s.name as name, s.on_time_rate as on_time_rate, s.return_rate as return_rate, item_count
+ORDER BY s.on_time_rate DESC
+"""
+
+# /api/logistics
+CARRIER_DELAYS_QUERY = """
+MATCH (i:Item)-[r:SHIPPED_VIA]->(c:Carrier)
+WHERE r.delayed = true
+WITH c.name as carrier, count(*) as delay_count, collect(r.reason) as reasons
+RETURN carrier, delay_count, reasons
+ORDER BY delay_count DESC
+"""
+
+# RAG graph context: items whose name, or whose supplier's or carrier's name,
+# contains $q. One labeled branch per name so each starts from a text index
+# seek; an OR over an unlabeled neighbour would scan every node.
+GRAPH_CONTEXT_QUERY = """
+CALL {
+    MATCH (i:Item)-[r]-(n) WHERE i.name CONTAINS $q RETURN i, r, n LIMIT 5
+    UNION
+    MATCH (i:Item)-[r]-(n:Supplier) WHERE n.name CONTAINS $q RETURN i, r, n LIMIT 5
+    UNION
+    MATCH (i:Item)-[r]-(n:Carrier) WHERE n.name CONTAINS $q RETURN i, r, n LIMIT 5
+}
+RETURN i, r, n
+LIMIT 5
+"""
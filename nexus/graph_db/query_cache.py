@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# The graph generation lives in the graph itself so every process (ingestion,
+# API workers) sees the same value. Ingestion bumps it after writing.
+GENERATION_QUERY = "MATCH (m:GraphMeta {name: 'graph'}) RETURN m.generation AS generation"
+BUMP_GENERATION_QUERY = """
+MERGE (m:GraphMeta {name: 'graph'})
+SET m.generation = coalesce(m.generation, 0) + 1
+RETURN m.generation AS generation
+"""
+
+MISS = object()
+
+
+class QueryCache:
+    """TTL + LRU cache of query results, invalidated when the graph generation changes.
+
+    Entries are keyed by whitespace-normalized query text and params. The
+    generation is re-read at most every generation_check seconds, so a cached
+    read usually costs a dictionary lookup. Size is bounded by the JSON size
+    of the cached results. Cached results are shared, so callers must not
+    mutate them.
+    """
+
+    def __init__(self, ttl=300, max_bytes=64 * 2**20, generation_check=5):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.generation_check = generation_check
+        self.generation = None
+        self._checked_at = None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(cypher_query, params=None):
+        return ' '.join(cypher_query.split()), json.dumps(params or {}, sort_keys=True, default=str)
+
+    def needs_generation_check(self):
+        return self._checked_at is None or time.monotonic() - self._checked_at >= self.generation_check
+
+    def set_generation(self, generation):
+        """Record the current graph generation, dropping everything if it moved"""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if generation != self.generation:
+                self.generation = generation
+                self._entries.clear()
+                self._bytes = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return MISS
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, generation):
+        """Cache value if it was computed at the current generation"""
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic(), size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        self._bytes -= self._entries.pop(key)[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
@@ -0,0 +1,134 @@
+"""
+Constraints and indexes for the supply-chain graph.
+
+apply_schema() is idempotent (IF NOT EXISTS) and runs before every ingestion.
+check_index_usage() EXPLAINs the exact statements the loader, the API servers
+and the RAG pipeline run, and reports whether each one is planned from index
+seeks without a label or type scan. From the command line:
+
+    python -m graph_db.schema            # apply and check
+"""
+
+# Uniqueness constraints also create the range index used for key lookups
+CONSTRAINTS = {
+    'item_id_unique': "CREATE CONSTRAINT item_id_unique IF NOT EXISTS FOR (i:Item) REQUIRE i.item_id IS UNIQUE",
+    'supplier_id_unique': "CREATE CONSTRAINT supplier_id_unique IF NOT EXISTS FOR (s:Supplier) REQUIRE s.supplier_id IS UNIQUE",
+    'carrier_name_unique': "CREATE CONSTRAINT carrier_name_unique IF NOT EXISTS FOR (c:Carrier) REQUIRE c.name IS UNIQUE",
+    'customer_id_unique': "CREATE CONSTRAINT customer_id_unique IF NOT EXISTS FOR (c:Customer) REQUIRE c.customer_id IS UNIQUE",
+}
+
+INDEXES = {
+    # Low-stock filters and ordering
+    'item_stock': "CREATE RANGE INDEX item_stock IF NOT EXISTS FOR (i:Item) ON (i.stock)",
+    'supplier_on_time_rate': "CREATE RANGE INDEX supplier_on_time_rate IF NOT EXISTS FOR (s:Supplier) ON (s.on_time_rate)",
+    # Delayed-shipment filters
+    'shipped_via_delayed': "CREATE RANGE INDEX shipped_via_delayed IF NOT EXISTS FOR ()-[r:SHIPPED_VIA]-() ON (r.delayed)",
+    # Delta ingestion finds shipments and returns by their CSV key
+    'shipped_via_shipment_id': "CREATE RANGE INDEX shipped_via_shipment_id IF NOT EXISTS FOR ()-[r:SHIPPED_VIA]-() ON (r.shipment_id)",
+    'returned_by_return_id': "CREATE RANGE INDEX returned_by_return_id IF NOT EXISTS FOR ()-[r:RETURNED_BY]-() ON (r.return_id)",
+    # Name CONTAINS lookups from the RAG graph query
+    'item_name_text': "CREATE TEXT INDEX item_name_text IF NOT EXISTS FOR (i:Item) ON (i.name)",
+    'supplier_name_text': "CREATE TEXT INDEX supplier_name_text IF NOT EXISTS FOR (s:Supplier) ON (s.name)",
+    'carrier_name_text': "CREATE TEXT INDEX carrier_name_text IF NOT EXISTS FOR (c:Carrier) ON (c.name)",
+}
+
+# Checked queries that list every node of a label by design; they are
+# EXPLAINed and reported, but a scan does not fail the check
+SCAN_BY_DESIGN = {'api high demand', 'api supplier performance'}
+
+# Operators that read from an index rather than scanning a label or type
+SEEK_OPERATORS = ('IndexSeek', 'IndexContainsScan', 'IndexEndsWithScan')
+# Operators that touch every node or relationship of a label or type
+SCAN_OPERATORS = ('AllNodesScan', 'NodeByLabelScan', 'RelationshipTypeScan', 'AllRelationshipsScan')
+
+
+def checked_queries():
+    """{name: (cypher, params)} for the statements the loader, API and RAG pipeline run"""
+    # Imported here because the loader imports apply_schema from this module
+    from graph_db import neo4j_client as loader
+    from graph_db import queries
+
+    item = {'item_id': '1001', 'name': 'Widget', 'stock': 10, 'warehouse_id': 'W1', 'demand': 20}
+    supplier = {'supplier_id': 'S001', 'name': 'Alpha', 'item_id': '1001', 'on_time': 0.9, 'return_rate': 0.1}
+    shipment = {'shipment_id': 'L0001', 'item_id': '1001', 'carrier': 'CarrierA', 'delayed': 'yes', 'reason': 'Weather'}
+    ret = {'return_id': 'R0001', 'item_id': '1001', 'customer_id': 'C100', 'reason': 'Damaged', 'date': '2024-01-01'}
+    return {
+        'load items': (loader.ITEM_QUERY, {'rows': [item]}),
+        'load suppliers': (loader.SUPPLIER_QUERY, {'rows': [supplier]}),
+        'load shipments': (loader.SHIPMENT_QUERY, {'rows': [shipment]}),
+        'load returns': (loader.RETURN_QUERY, {'rows': [ret]}),
+        'delete items': (loader.DELETE_ITEMS_QUERY, {'keys': ['1001']}),
+        'delete suppliers': (loader.DELETE_SUPPLIERS_QUERY, {'keys': ['S001']}),
+        'delete shipments': (loader.DELETE_SHIPMENTS_QUERY, {'keys': ['L0001']}),
+        'delete returns': (loader.DELETE_RETURNS_QUERY, {'keys': ['R0001']}),
+        'api kpis': (queries.KPI_QUERY, {}),
+        'api low stock': (queries.LOW_STOCK_QUERY, {}),
+        'api high demand': (queries.HIGH_DEMAND_QUERY, {}),
+        'api supplier performance': (queries.SUPPLIER_PERFORMANCE_QUERY, {}),
+        'api carrier delays': (queries.CARRIER_DELAYS_QUERY, {}),
+        'rag graph context': (queries.GRAPH_CONTEXT_QUERY, {'q': 'Widget'}),
+    }
+
+
+def apply_schema(client, timeout=300):
+    """Create any missing constraints/indexes and wait for them to come online"""
+    with client.driver.session() as session:
+        for statement in list(CONSTRAINTS.values()) + list(INDEXES.values()):
+            session.run(statement).consume()
+        session.run("CALL db.awaitIndexes($timeout)", timeout=timeout).consume()
+    return list(CONSTRAINTS) + list(INDEXES)
+
+
+def explain_plan(client, cypher_query, params=None):
+    """Return the planner's plan for a query without running it"""
+    with client.driver.session() as session:
+        return session.run("EXPLAIN " + cypher_query, params or {}).consume().plan
+
+
+def plan_operators(plan):
+    """Flatten a plan tree into a list of operator names, e.g. 'NodeUniqueIndexSeek'"""
+    operators = [plan['operatorType'].split('@')[0]]
+    for child in plan.get('children', []):
+        operators.extend(plan_operators(child))
+    return operators
+
+
+def uses_index(operators):
+    """True when a plan seeks an index and never scans a whole label or type"""
+    seeks = any(op in o for o in operators for op in SEEK_OPERATORS)
+    scans = any(op in o for o in operators for op in SCAN_OPERATORS)
+    return seeks and not scans
+
+
+def check_index_usage(client, queries=None):
+    """EXPLAIN each query (default: checked_queries()); returns {name: (uses_index, operators)}"""
+    report = {}
+    for name, (cypher_query, params) in (queries or checked_queries()).items():
+        operators = plan_operators(explain_plan(client, cypher_query, params))
+        report[name] = (uses_index(operators), operators)
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+    import sys
+    from dotenv import load_dotenv
+    from graph_db.neo4j_client import Neo4jClient
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Apply the graph schema and check index usage')
+    parser.add_argument('--check-only', action='store_true', help='skip creating constraints/indexes')
+    args = parser.parse_args()
+
+    client = Neo4jClient(os.getenv('NEO4J_URI'), os.getenv('NEO4J_USER'), os.getenv('NEO4J_PASSWORD'))
+    try:
+        if not args.check_only:
+            print(f"Schema applied: {', '.join(apply_schema(client))}")
+        report = check_index_usage(client)
+    finally:
+        client.close()
+    for name, (indexed, operators) in report.items():
+        mark = '✅' if indexed else '➖' if name in SCAN_BY_DESIGN else '❌'
+        print(f"{mark} {name}: {' <- '.join(operators)}")
+    sys.exit(0 if all(indexed or name in SCAN_BY_DESIGN for name, (indexed, _) in report.items()) else 1)
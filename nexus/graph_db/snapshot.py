@@ -0,0 +1,50 @@
+import os
+
+import pandas as pd
+
+
+def row_hashes(df, key):
+    """uint64 hash of every CSV row, indexed by the row's primary key.
+
+    df should be read with dtype=str so a row hashes the same whichever
+    chunk it lands in.
+    """
+    return pd.Series(pd.util.hash_pandas_object(df, index=False).values,
+                     index=pd.Index(df[key], name='key'), name='hash')
+
+
+class GraphSnapshot:
+    """Primary key -> row hash of the CSV rows last written to the graph.
+
+    One small CSV per table in directory. A table's file is only replaced
+    after all of its changes are committed, so an interrupted refresh is
+    simply diffed again on the next run.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, table):
+        return os.path.join(self.directory, f'{table}.csv')
+
+    def exists(self, tables):
+        return all(os.path.exists(self._path(t)) for t in tables)
+
+    def load(self, table):
+        """Return the table's hashes as a Series, or None if it was never ingested"""
+        if not os.path.exists(self._path(table)):
+            return None
+        df = pd.read_csv(self._path(table), dtype={'key': str, 'hash': 'uint64'})
+        hashes = pd.Series(df['hash'].values, index=pd.Index(df['key'], name='key'), name='hash')
+        return hashes[~hashes.index.duplicated(keep='last')]
+
+    def save(self, table, hashes):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._path(table) + '.tmp'
+        hashes.to_frame().to_csv(tmp_path)
+        os.replace(tmp_path, self._path(table))
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                os.remove(os.path.join(self.directory, name))
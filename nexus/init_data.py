@@ -1,9 +1,11 @@
 import os
+import sys
 from dotenv import load_dotenv
 from graph_db.neo4j_client import Neo4jClient
-from vector_db.vector_store import VectorStore
-import pandas as pd
-import pickle
+from vector_db.vector_store import EncoderMismatchError, VectorStore
+from vector_db.embedding_cache import EmbeddingCache
+from vector_db.index_builder import (StreamingIndexBuilder, iter_documents, inventory_documents,
+                                     supplier_documents, logistics_documents, returns_documents)
 
 load_dotenv()
 
@@ -18,39 +20,114 @@ INVENTORY_PATH = os.path.join(DATA_DIR, 'inventory.csv')
 SUPPLIERS_PATH = os.path.join(DATA_DIR, 'suppliers.csv')
 LOGISTICS_PATH = os.path.join(DATA_DIR, 'logistics.csv')
 RETURNS_PATH = os.path.join(DATA_DIR, 'returns.csv')
+VECTOR_INDEX_DIR = os.path.join(os.path.dirname(__file__), 'vector_db', 'vector_index')
+VECTOR_BUILD_DIR = os.path.join(os.path.dirname(__file__), 'vector_db', 'vector_index.build')
+# CSV rows sent per UNWIND transaction
+NEO4J_BATCH_SIZE = int(os.getenv('NEO4J_BATCH_SIZE', '1000'))
+# Worker threads for the supplier/carrier/customer subgraphs (1 = sequential)
+NEO4J_INGEST_WORKERS = int(os.getenv('NEO4J_INGEST_WORKERS', '3'))
+# Primary key -> row hash of the rows last written to the graph
+GRAPH_SNAPSHOT_DIR = os.getenv('GRAPH_SNAPSHOT_DIR', os.path.join(os.path.dirname(__file__), 'graph_db', 'snapshot'))
 
 # 1. Load data into Neo4j
 graph = Neo4jClient(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
-print('Loading data into Neo4j...')
-graph.create_graph_from_csvs(INVENTORY_PATH, SUPPLIERS_PATH, LOGISTICS_PATH, RETURNS_PATH)
+if '--rebuild' in sys.argv:
+    print('Loading data into Neo4j...')
+    ingest_stats = graph.create_graph_from_csvs(INVENTORY_PATH, SUPPLIERS_PATH, LOGISTICS_PATH, RETURNS_PATH,
+                                                batch_size=NEO4J_BATCH_SIZE, snapshot_dir=GRAPH_SNAPSHOT_DIR,
+                                                workers=NEO4J_INGEST_WORKERS)
+    for table, stat in ingest_stats.items():
+        print(f"  {table}: {stat['rows']} rows in {stat['seconds']:.2f}s ({stat['rows_per_sec']:.0f} rows/s)")
+else:
+    # Only rows that changed since the last run are written; the graph stays
+    # readable throughout
+    print('Updating Neo4j graph...')
+    ingest_stats = graph.update_graph_from_csvs(INVENTORY_PATH, SUPPLIERS_PATH, LOGISTICS_PATH, RETURNS_PATH,
+                                                GRAPH_SNAPSHOT_DIR, batch_size=NEO4J_BATCH_SIZE,
+                                                workers=NEO4J_INGEST_WORKERS)
+    for table, stat in ingest_stats.items():
+        print(f"  {table}: {stat['created']} created, {stat['updated']} updated, {stat['deleted']} deleted, "
+              f"{stat['unchanged']} unchanged ({stat['seconds']:.2f}s)")
 graph.close()
 print('Neo4j graph created.')
 
-# 2. Build vector index from all text fields in the CSVs
+# 2. Build vector index from all text fields in the CSVs, streamed in chunks
 print('Building vector index...')
-texts = []
-# Inventory
-inv = pd.read_csv(INVENTORY_PATH)
-for _, row in inv.iterrows():
-    texts.append(f"Item: {row['item_name']} (Stock: {row['stock']}, Demand: {row['predicted_demand_next_week']})")
-# Suppliers
-sup = pd.read_csv(SUPPLIERS_PATH)
-for _, row in sup.iterrows():
-    texts.append(f"Supplier: {row['supplier_name']} (On-time: {row['on_time_rate']}, Return rate: {row['return_rate']})")
-# Logistics
-log = pd.read_csv(LOGISTICS_PATH)
-for _, row in log.iterrows():
-    texts.append(f"Shipment: {row['shipment_id']} for Item {row['item_id']} via {row['carrier']} (Delayed: {row['delayed']}, Reason: {row['delay_reason']})")
-# Returns
-ret = pd.read_csv(RETURNS_PATH)
-for _, row in ret.iterrows():
-    texts.append(f"Return: {row['return_id']} for Item {row['item_id']} by Customer {row['customer_id']} (Reason: {row['return_reason']}, Date: {row['date']})")
-
-vector_store = VectorStore()
-vector_store.build_index(texts)
-
-# Optionally, save the vector store for later use
-with open(os.path.join('vector_db', 'vector_index.pkl'), 'wb') as f:
-    pickle.dump({'texts': vector_store.texts, 'embeddings': vector_store.embeddings}, f)
+# Stable document ids let later runs re-encode only changed rows; metadata
+# feeds filtered vector search
+DOCUMENT_TABLES = [
+    (INVENTORY_PATH, inventory_documents),
+    (SUPPLIERS_PATH, supplier_documents),
+    (LOGISTICS_PATH, logistics_documents),
+    (RETURNS_PATH, returns_documents),
+]
+CSV_CHUNK_SIZE = int(os.getenv('CSV_CHUNK_SIZE', '50000'))
+ENCODE_BATCH_SIZE = int(os.getenv('ENCODE_BATCH_SIZE', '1024'))
 
+# Index type: 'flat' (exact), 'ivf' or 'hnsw' (approximate, for large datasets),
+# or 'pq', 'sq8', 'ivfpq' (compressed, 4-16x smaller in memory)
+VECTOR_INDEX_TYPE = os.getenv('VECTOR_INDEX_TYPE', 'flat')
+VECTOR_NLIST = int(os.getenv('VECTOR_NLIST', '0')) or None
+VECTOR_PQ_M = int(os.getenv('VECTOR_PQ_M', '0')) or None
+
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'paraphrase-MiniLM-L3-v2')
+# 'pytorch', or 'onnx' / 'onnx-int8' after python -m vector_db.encoders
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'pytorch')
+ONNX_MODEL_DIR = os.getenv('ONNX_MODEL_DIR', os.path.join(os.path.dirname(__file__), 'vector_db', 'onnx_model'))
+
+# Embeddings of unchanged texts are reused across runs
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH',
+                                 os.path.join(os.path.dirname(__file__), 'vector_db', 'embedding_cache.sqlite'))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '500000'))
+# Backends produce slightly different vectors, so they get separate cache keys
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, f"{EMBEDDING_MODEL}:{EMBEDDING_BACKEND}", EMBEDDING_CACHE_MAX_ENTRIES)
+
+def make_vector_store():
+    return VectorStore(model_name=EMBEDDING_MODEL, index_type=VECTOR_INDEX_TYPE, nlist=VECTOR_NLIST,
+                       pq_m=VECTOR_PQ_M, embedding_cache=embedding_cache,
+                       encoder_backend=EMBEDDING_BACKEND, onnx_dir=ONNX_MODEL_DIR)
+
+vector_store = make_vector_store()
+
+# Apply only the changed rows to an existing index unless --rebuild is given
+incremental = False
+if '--rebuild' not in sys.argv and os.path.isdir(VECTOR_INDEX_DIR):
+    try:
+        vector_store.load_index(VECTOR_INDEX_DIR, mmap=False)
+        incremental = vector_store.doc_ids is not None and vector_store.index_type == VECTOR_INDEX_TYPE
+    except EncoderMismatchError as e:
+        # Vectors from another encoder can't be mixed with new ones
+        print(f"{e}; rebuilding.")
+
+if incremental:
+    # Diff chunk by chunk, then apply all changes in one upsert encoded
+    # ENCODE_BATCH_SIZE texts at a time
+    changes = {'added': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+    seen_ids = set()
+    changed_ids, changed_texts, changed_metadata = [], [], []
+    for ids, texts, metadata in iter_documents(DOCUMENT_TABLES, CSV_CHUNK_SIZE):
+        seen_ids.update(ids)
+        changed, counts = vector_store.diff(ids, texts)
+        for key, count in counts.items():
+            changes[key] += count
+        changed_ids.extend(ids[i] for i in changed)
+        changed_texts.extend(texts[i] for i in changed)
+        changed_metadata.extend(metadata[i] for i in changed)
+    removed = [doc_id for doc_id in vector_store.doc_ids if doc_id and doc_id not in seen_ids]
+    vector_store.delete(removed)
+    changes['deleted'] += len(removed)
+    vector_store.upsert(changed_ids, changed_texts, changed_metadata, batch_size=ENCODE_BATCH_SIZE)
+    print(f"Vector index updated: {changes['added']} added, {changes['updated']} updated, "
+          f"{changes['deleted']} deleted, {changes['unchanged']} unchanged.")
+    # Save the vector store as a native FAISS index with memory-mapped sidecars
+    vector_store.save_index(VECTOR_INDEX_DIR)
+else:
+    # Streams CSV chunks through fixed-size encode batches, checkpointing each
+    # batch so a crashed build resumes where it stopped
+    builder = StreamingIndexBuilder(make_vector_store(), VECTOR_BUILD_DIR, ENCODE_BATCH_SIZE)
+    builder.build([path for path, _ in DOCUMENT_TABLES], iter_documents(DOCUMENT_TABLES, CSV_CHUNK_SIZE))
+    builder.finalize(VECTOR_INDEX_DIR)
+
+print(f"Embedding cache: {embedding_cache.hits} hits, {embedding_cache.misses} encoded.")
+embedding_cache.close()
 print('Vector index built and saved.') 
\ No newline at end of file
@@ -0,0 +1,38 @@
+import re
+import time
+from types import SimpleNamespace
+
+
+class FakeLLMClient:
+    """Offline stand-in for the OpenAI client (LLM_BACKEND=fake).
+
+    Supports client.chat.completions.create(..., stream=True/False) and
+    answers with a short HTML summary of the prompt, streamed a word at a
+    time with token_delay seconds between words.
+    """
+
+    def __init__(self, token_delay=0.02):
+        self.token_delay = token_delay
+        self.chat = SimpleNamespace(completions=self)
+
+    def _answer(self, messages):
+        prompt = messages[-1]['content']
+        match = re.search(r'User Query:\s*\n(.+)', prompt)
+        question = match.group(1).strip() if match else prompt[:80]
+        return (f"<h3>Offline answer</h3><p>You asked: <strong>{question}</strong></p>"
+                f"<p>This response comes from the fake LLM backend; the prompt was "
+                f"<strong>{len(prompt.split())}</strong> words long.</p>")
+
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        answer = self._answer(messages)
+        if stream:
+            return self._stream(answer)
+        # Same total latency as the streamed answer, all paid up front
+        time.sleep(self.token_delay * len(re.findall(r'\S+\s*', answer)))
+        message = SimpleNamespace(content=answer)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    def _stream(self, answer):
+        for token in re.findall(r'\S+\s*', answer):
+            time.sleep(self.token_delay)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
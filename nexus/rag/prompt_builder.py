@@ -0,0 +1,165 @@
+import re
+from functools import lru_cache
+
+# Sections are filled in this order until the token budget runs out; each
+# one is rendered at its usual place in the prompt regardless of priority
+SECTION_PRIORITY = ['stats', 'vector', 'graph', 'visual']
+SECTION_JOINERS = {'vector': '\n---\n', 'stats': '\n\n', 'graph': '\n', 'visual': '\n'}
+
+PROMPT_TEMPLATE = """
+You are an intelligent assistant analyzing supply chain and logistics data.
+
+User Query:
+{user_query}
+
+Relevant Context from Vector Search:
+{vector}
+
+Statistical Analysis from Dataset:
+{stats}
+
+Supplier Visual Performance Insight:
+{visual}
+
+Graph Database Insights:
+{graph}
+
+Instructions:
+1. Answer based on the full dataset insights and factual numbers.
+2. Clearly mention which carriers, suppliers, or items are performing better or worse.
+3. Include specific statistics like counts and percentages.
+4. Point out any operational risks, inefficiencies, or key takeaways.
+5. Write in simple, clear language, avoiding repetition.
+6. Format your response as HTML with proper tags for better UI rendering:
+   - Use <h3> for main insights
+   - Use <ul><li> for lists
+   - Use <strong> for important numbers/percentages
+   - Use <p> for paragraphs
+   - Use <div style="color: red;"> for risks/warnings
+   - Use <div style="color: green;"> for positive insights
+"""
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    """tiktoken encoding for model, or None to fall back to an estimate"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding('cl100k_base')
+    except Exception as e:
+        # The BPE ranks are downloaded on first use; offline hosts estimate instead
+        print(f"tiktoken unavailable ({e}), estimating prompt tokens")
+        return None
+
+
+def count_tokens(text, model='gpt-3.5-turbo'):
+    """Token count of text for model; words and punctuation marks when tiktoken is unavailable"""
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(re.findall(r"\w+|[^\w\s]", text))
+    return len(encoding.encode(text))
+
+
+def _squeeze(text):
+    """Collapse the column padding of to_string() tables; the LLM does not need alignment"""
+    return re.sub(r'[ \t]{2,}', ' ', text.strip())
+
+
+def dedupe_chunks(vector_chunks):
+    """Chunk texts in relevance order, dropping repeats that differ only in case or whitespace"""
+    seen = set()
+    texts = []
+    for chunk in vector_chunks:
+        key = ' '.join(chunk[0].lower().split())
+        if key not in seen:
+            seen.add(key)
+            texts.append(chunk[0].strip())
+    return texts
+
+
+def _compact_value(value):
+    if isinstance(value, dict):
+        name = value.get('name')
+        props = ', '.join(f"{key}={value[key]}" for key in sorted(value)
+                          if key != 'name' and value[key] not in (None, ''))
+        if name and props:
+            return f"{name} ({props})"
+        return str(name or props)
+    if isinstance(value, (list, tuple)) and len(value) == 3 and isinstance(value[1], str):
+        # record.data() renders a relationship as (start, type, end); the
+        # endpoints are already in the row, so keep just the type
+        return value[1]
+    return str(value)
+
+
+def compact_graph_records(records):
+    """One 'node | REL | node' row per record instead of the raw record dicts, without repeats"""
+    rows = []
+    for record in records or []:
+        row = ' | '.join(_compact_value(value) for value in record.values())
+        if row not in rows:
+            rows.append(row)
+    return rows
+
+
+def render_prompt(user_query, sections):
+    """Fill the prompt template with already-joined section texts"""
+    return PROMPT_TEMPLATE.format(
+        user_query=user_query,
+        vector=sections.get('vector') or '',
+        stats=sections.get('stats') or '',
+        visual=sections.get('visual') or '',
+        graph=sections.get('graph') or "No related graph data found.",
+    ).strip()
+
+
+def assemble_prompt(user_query, vector_chunks, stats_context, graph_context, visual_insight,
+                    budget=1500, model='gpt-3.5-turbo'):
+    """Build the LLM prompt within budget tokens; returns (prompt, metrics).
+
+    Each section is split into items (chunks, statistics tables, graph rows,
+    the visual insight as a whole) and items are added in SECTION_PRIORITY
+    order while they fit. metrics compares the result with the unbudgeted
+    prompt the same inputs used to produce.
+    """
+    items = {
+        'vector': dedupe_chunks(vector_chunks),
+        'stats': [_squeeze(part) for part in (stats_context or '').split('\n\n') if part.strip()],
+        'graph': compact_graph_records(graph_context),
+        'visual': [visual_insight.strip()] if visual_insight else [],
+    }
+    kept = {name: [] for name in items}
+    dropped = {name: 0 for name in items}
+    used = count_tokens(render_prompt(user_query, {}), model)
+    for name in SECTION_PRIORITY:
+        joiner_tokens = count_tokens(SECTION_JOINERS[name], model)
+        for item in items[name]:
+            cost = count_tokens(item, model) + joiner_tokens
+            if used + cost > budget:
+                dropped[name] += 1
+                continue
+            kept[name].append(item)
+            used += cost
+
+    prompt = render_prompt(user_query, {name: SECTION_JOINERS[name].join(parts) for name, parts in kept.items()})
+    unbudgeted = render_prompt(user_query, {
+        'vector': "\n---\n".join(chunk[0] for chunk in vector_chunks),
+        'stats': stats_context,
+        'visual': visual_insight,
+        'graph': str(graph_context) if graph_context else None,
+    })
+    metrics = {
+        'tokens_before': count_tokens(unbudgeted, model),
+        'tokens_after': count_tokens(prompt, model),
+        'budget': budget,
+        'section_tokens': {name: count_tokens(SECTION_JOINERS[name].join(parts), model)
+                           for name, parts in kept.items()},
+        'dropped_items': dropped,
+        'tokenizer': 'tiktoken' if _encoding(model) is not None else 'estimate',
+    }
+    return prompt, metrics
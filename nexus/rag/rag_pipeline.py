@@ -1,10 +1,16 @@
 import os
+import re
 from dotenv import load_dotenv
 from openai import OpenAI
-from vector_db.vector_store import VectorStore
+from vector_db.vector_store import VectorStore, COMPRESSED_INDEX_TYPES
+from vector_db.index_builder import KEY_DOC_ID_PREFIXES
+from rag.semantic_cache import SemanticCache
+from rag.stats_store import stats_store, DATA_DIR
+from rag.prompt_builder import assemble_prompt
 from graph_db.neo4j_client import Neo4jClient
-import pandas as pd
-from functools import lru_cache
+from graph_db.queries import GRAPH_CONTEXT_QUERY
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import time
 
 # Load environment variables
 load_dotenv()
@@ -15,60 +21,140 @@ NEO4J_USER = os.getenv('NEO4J_USER')
 NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD')
 
 # Initialize services
-vector_store = VectorStore()
-vector_store.load_index(os.path.join(os.path.dirname(__file__), '..', 'vector_db', 'vector_index.pkl'))
+VECTOR_DB_DIR = os.path.join(os.path.dirname(__file__), '..', 'vector_db')
+VECTOR_INDEX_PATH = os.path.join(VECTOR_DB_DIR, 'vector_index')
+if not os.path.isdir(VECTOR_INDEX_PATH):
+    # Fall back to the legacy pickle written by older init_data.py runs
+    VECTOR_INDEX_PATH = os.path.join(VECTOR_DB_DIR, 'vector_index.pkl')
+
+vector_store = VectorStore(
+    model_name=os.getenv('EMBEDDING_MODEL', 'paraphrase-MiniLM-L3-v2'),
+    encoder_backend=os.getenv('EMBEDDING_BACKEND', 'pytorch'),
+    onnx_dir=os.getenv('ONNX_MODEL_DIR', os.path.join(VECTOR_DB_DIR, 'onnx_model')),
+)
+vector_store.load_index(VECTOR_INDEX_PATH)
+vector_store.set_search_params(
+    nprobe=int(os.getenv('VECTOR_NPROBE', '16')),
+    ef_search=int(os.getenv('VECTOR_EF_SEARCH', '64')),
+    # Compressed indexes re-rank a few extra candidates against the exact vectors
+    rerank_factor=int(os.getenv('VECTOR_RERANK_FACTOR',
+                                '4' if vector_store.index_type in COMPRESSED_INDEX_TYPES else '1')),
+)
 print(f"VectorStore index: {vector_store.index}")
 
 neo4j_client = Neo4jClient(NEO4J_URI, NEO4J_USER, NEO4J_PASSWORD)
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-# Cache data loading to avoid repeated file I/O
-@lru_cache(maxsize=1)
-def load_cached_data():
-    """Load and cache all data files once"""
-    data_dir = os.path.join(os.path.dirname(__file__), '..', 'data')
-    return {
-        'logistics': pd.read_csv(os.path.join(data_dir, 'logistics.csv')),
-        'suppliers': pd.read_csv(os.path.join(data_dir, 'suppliers.csv')),
-        'returns': pd.read_csv(os.path.join(data_dir, 'returns.csv')),
-        'inventory': pd.read_csv(os.path.join(data_dir, 'inventory.csv'))
-    }
+# LLM_BACKEND=fake answers offline, for tests and demos without an API key
+if os.getenv('LLM_BACKEND', 'openai') == 'fake':
+    from rag.fake_llm import FakeLLMClient
+    client = FakeLLMClient(token_delay=float(os.getenv('FAKE_LLM_TOKEN_DELAY', '0.02')))
+else:
+    client = OpenAI(api_key=OPENAI_API_KEY)
+
+LLM_OPTIONS = {
+    'model': "gpt-3.5-turbo",
+    'max_tokens': 500,  # Limit response length for faster generation
+    'temperature': 0.3,  # Lower temperature for more focused responses
+}
+# Prompt context is trimmed by priority to fit this many tokens
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '1500'))
+
+# Answers to paraphrases of earlier questions are served from the semantic
+# cache; SEMANTIC_CACHE=0 disables it
+semantic_cache = None
+if os.getenv('SEMANTIC_CACHE', '1') == '1':
+    semantic_cache = SemanticCache(
+        threshold=float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.9')),
+        ttl=float(os.getenv('SEMANTIC_CACHE_TTL', '3600')),
+        max_entries=int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '1000')),
+    )
+
+def data_version():
+    """Signature of the data files and vector index; changes whenever either is rewritten"""
+    paths = [os.path.join(DATA_DIR, name) for name in sorted(os.listdir(DATA_DIR)) if name.endswith('.csv')]
+    paths.append(VECTOR_INDEX_PATH)
+    version = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            version.append((path, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            version.append((path, None, None))
+    return tuple(version)
 
 def get_statistical_context(query):
-    """Get statistical summaries from the cached data"""
+    """Get statistical summaries from the precomputed statistics store"""
     stats = []
-    data = load_cached_data()
+    sections = stats_store.get()['sections']
 
     if 'carrier' in query.lower() or 'delay' in query.lower() or 'logistics' in query.lower():
-        logistics_df = data['logistics']
-        delay_counts = logistics_df[logistics_df['delayed'] == 'yes'].groupby('carrier').size()
-        total_shipments = logistics_df.groupby('carrier').size()
-        stats.append(f"Carrier Delay Counts:\n{delay_counts.to_string()}")
-        stats.append(f"Total Shipments per Carrier:\n{total_shipments.to_string()}")
+        stats.extend(sections['carriers'])
 
     if 'supplier' in query.lower() or 'return' in query.lower():
-        suppliers_df = data['suppliers']
-        avg_rates = suppliers_df.groupby('supplier_name').agg({
-            'on_time_rate': 'mean',
-            'return_rate': 'mean'
-        }).round(3)
-        stats.append(f"Supplier Performance (Avg On-Time & Return Rates):\n{avg_rates.to_string()}")
+        stats.extend(sections['suppliers'])
 
     if 'return' in query.lower():
-        returns_df = data['returns']
-        return_reasons = returns_df['return_reason'].value_counts()
-        total_returns = len(returns_df)
-        stats.append(f"Total Returns: {total_returns}")
-        stats.append(f"Top Return Reasons:\n{return_reasons.head(10).to_string()}")
-        
-        # Get shipment data for accurate return rate calculation
-        logistics_df = data['logistics']
-        total_shipments = len(logistics_df)
-        return_rate = (total_returns / total_shipments * 100) if total_shipments > 0 else 0
-        stats.append(f"Return Rate: {return_rate:.1f}% ({total_returns} returns out of {total_shipments} shipments)")
+        stats.extend(sections['returns'])
 
     return "\n\n".join(stats)
 
+# Literal identifiers mapped to the metadata field that indexes them; unique
+# keys resolve through document ids (see KEY_DOC_ID_PREFIXES)
+IDENTIFIER_PATTERNS = [
+    ('shipment_id', re.compile(r'\b(L\d{4,})\b', re.IGNORECASE)),
+    ('return_id', re.compile(r'\b(R\d{4,})\b', re.IGNORECASE)),
+    ('supplier_id', re.compile(r'\b(S\d{3,})\b', re.IGNORECASE)),
+    ('item_id', re.compile(r'\bitems?\s*(?:id\s*)?#?\s*(\d+)\b', re.IGNORECASE)),
+]
+
+def extract_identifiers(query):
+    """Find shipment, return, supplier and item ids mentioned in the query"""
+    found = []
+    for field, pattern in IDENTIFIER_PATTERNS:
+        for value in pattern.findall(query):
+            if (field, value.upper()) not in found:
+                found.append((field, value.upper()))
+    return found
+
+def lookup_identifiers(query, top_k=5):
+    """Direct lookup of rows for identifiers in the query, skipping the encoder"""
+    chunks = []
+    for field, value in extract_identifiers(query):
+        if field in KEY_DOC_ID_PREFIXES:
+            filters = {'doc_id': KEY_DOC_ID_PREFIXES[field] + value}
+        else:
+            filters = {field: value}
+        for chunk in vector_store.lookup(filters, limit=top_k):
+            if chunk not in chunks:
+                chunks.append(chunk)
+    return chunks[:top_k]
+
+def get_vector_filters(query):
+    """Restrict vector search to carriers or suppliers named in the query"""
+    query_lower = query.lower()
+    filters = {}
+    for field in ('carrier', 'supplier'):
+        named = [value for value in vector_store.filter_values(field) if value.lower() in query_lower]
+        if named:
+            filters[field] = named
+    # A question naming both a carrier and a supplier should match either
+    return [{field: values} for field, values in filters.items()]
+
+def search_vector_context(query, top_k=5, query_emb=None):
+    """Exact id lookup, then filtered vector search when the query names entities, else a plain search.
+
+    query_emb is the query's encoding when the caller already has it.
+    """
+    chunks = lookup_identifiers(query, top_k)
+    if chunks:
+        return chunks
+    if query_emb is None:
+        query_emb = vector_store.model.encode([query])
+    for filters in get_vector_filters(query):
+        chunks.extend(vector_store.search_vectors(query_emb, top_k=top_k, filters=filters)[0])
+    if not chunks:
+        return vector_store.search_vectors(query_emb, top_k=top_k)[0]
+    return sorted(chunks, key=lambda chunk: chunk[1])[:top_k]
+
 def get_supplier_visual_insight():
     """Returns hardcoded insights from supplier performance chart image"""
     return """
@@ -80,76 +166,142 @@ From the 'Supplier Return & On-Time Rates (last month)' chart:
 """
 
 def build_prompt(user_query, vector_chunks, stats_context, graph_context):
-    """Builds a clean, structured prompt for the LLM"""
-    context_section = "\n---\n".join([chunk[0] for chunk in vector_chunks])
-    graph_section = str(graph_context) if graph_context else "No related graph data found."
-    visual_insight = get_supplier_visual_insight()
-
-    prompt = f"""
-You are an intelligent assistant analyzing supply chain and logistics data.
-
-User Query:
-{user_query}
-
-Relevant Context from Vector Search:
-{context_section}
-
-Statistical Analysis from Dataset:
-{stats_context}
-
-Supplier Visual Performance Insight:
-{visual_insight}
-
-Graph Database Insights:
-{graph_section}
-
-Instructions:
-1. Answer based on the full dataset insights and factual numbers.
-2. Clearly mention which carriers, suppliers, or items are performing better or worse.
-3. Include specific statistics like counts and percentages.
-4. Point out any operational risks, inefficiencies, or key takeaways.
-5. Write in simple, clear language, avoiding repetition.
-6. Format your response as HTML with proper tags for better UI rendering:
-   - Use <h3> for main insights
-   - Use <ul><li> for lists
-   - Use <strong> for important numbers/percentages
-   - Use <p> for paragraphs
-   - Use <div style="color: red;"> for risks/warnings
-   - Use <div style="color: green;"> for positive insights
-"""
-    return prompt.strip()
+    """Builds a clean, structured prompt for the LLM within PROMPT_TOKEN_BUDGET; returns (prompt, metrics)"""
+    prompt, metrics = assemble_prompt(user_query, vector_chunks, stats_context, graph_context,
+                                      get_supplier_visual_insight(), budget=PROMPT_TOKEN_BUDGET,
+                                      model=LLM_OPTIONS['model'])
+    print(f"Prompt tokens: {metrics['tokens_before']} -> {metrics['tokens_after']} "
+          f"(budget {metrics['budget']}, {metrics['tokenizer']})")
+    return prompt, metrics
+
+def get_graph_context(user_query):
+    """Simplified graph query - only if query contains specific terms"""
+    if not any(term in user_query.lower() for term in ['item', 'supplier', 'carrier', 'customer']):
+        return None
+    return neo4j_client.query(GRAPH_CONTEXT_QUERY, {"q": user_query.split()[0]})
+
+# Retrieval stages run concurrently, each called with the query and its
+# encoding (or None); a stage that fails or misses its timeout (seconds)
+# contributes its fallback value instead of holding up the answer
+RETRIEVAL_STAGES = [
+    ('vector', lambda q, emb: search_vector_context(q, top_k=5, query_emb=emb),
+     float(os.getenv('RAG_VECTOR_TIMEOUT', '5')), []),
+    ('stats', lambda q, emb: get_statistical_context(q), float(os.getenv('RAG_STATS_TIMEOUT', '5')), ''),
+    ('graph', lambda q, emb: get_graph_context(q), float(os.getenv('RAG_GRAPH_TIMEOUT', '3')), None),
+]
+# Timed-out stages keep their worker until they finish, so leave headroom
+retrieval_pool = ThreadPoolExecutor(max_workers=int(os.getenv('RAG_RETRIEVAL_WORKERS', '12')),
+                                    thread_name_prefix='rag-retrieval')
+
+def retrieve_context(user_query, query_emb=None, id_chunks=None):
+    """Run the vector, statistics and graph stages in parallel; returns {stage: result}.
+
+    id_chunks, the rows of identifiers the query names, replace the vector stage.
+    """
+    start = time.perf_counter()
+    futures = [(name, retrieval_pool.submit(stage, user_query, query_emb), timeout, fallback)
+               for name, stage, timeout, fallback in RETRIEVAL_STAGES
+               if not (name == 'vector' and id_chunks)]
+    results = {'vector': id_chunks} if id_chunks else {}
+    for name, future, timeout, fallback in futures:
+        try:
+            results[name] = future.result(timeout=max(0, start + timeout - time.perf_counter()))
+        except FutureTimeoutError:
+            print(f"{name.capitalize()} stage timed out after {timeout}s")
+            results[name] = fallback
+        except Exception as e:
+            print(f"{name.capitalize()} stage failed: {e}")
+            results[name] = fallback
+    return results
+
+def cache_scope(user_query):
+    """Identifiers and named carriers/suppliers; a cached answer is only reused for the same ones"""
+    named = tuple(sorted((field, tuple(sorted(values)))
+                         for filters in get_vector_filters(user_query) for field, values in filters.items()))
+    return tuple(sorted(extract_identifiers(user_query))), named
+
+def cached_answer(user_query):
+    """Resolve identifiers directly, otherwise look the query up in the semantic cache.
+
+    Returns (answer or None, query encoding, id_chunks, key for store_answer).
+    Queries whose identifiers resolve skip the encoder and the cache.
+    """
+    id_chunks = lookup_identifiers(user_query)
+    if semantic_cache is None or id_chunks:
+        return None, None, id_chunks, None
+    query_emb = vector_store.model.encode([user_query])
+    key = (semantic_cache.normalize(query_emb), data_version(), cache_scope(user_query))
+    answer, _ = semantic_cache.get(*key)
+    return answer, query_emb, None, key
+
+def store_answer(key, user_query, answer):
+    if key is not None and answer:
+        vector, version, scope = key
+        semantic_cache.put(vector, user_query, answer, version, scope)
 
 def rag_query(user_query):
     """End-to-end RAG pipeline with optimized performance"""
     try:
-        # Parallel processing could be added here for even better performance
-        top_chunks = vector_store.search(user_query, top_k=5)  # Reduced from 10 to 5 for speed
-        
-        # Simplified graph query - only if query contains specific terms
-        graph_context = None
-        if any(term in user_query.lower() for term in ['item', 'supplier', 'carrier', 'customer']):
-            cypher = """
-            MATCH (i:Item)-[r]-(n) 
-            WHERE i.name CONTAINS $q OR n.name CONTAINS $q 
-            RETURN i, r, n 
-            LIMIT 5
-            """
-            try:
-                graph_context = neo4j_client.query(cypher, {"q": user_query.split()[0]})
-            except Exception as e:
-                print(f"Graph query failed: {e}")
-                graph_context = None
-        
-        stats_context = get_statistical_context(user_query)
-        prompt = build_prompt(user_query, top_chunks, stats_context, graph_context)
+        answer, query_emb, id_chunks, cache_key = cached_answer(user_query)
+        if answer is not None:
+            return answer
+        # Time-to-prompt is the slowest retrieval stage, not the sum of all three
+        context = retrieve_context(user_query, query_emb, id_chunks)
+        prompt, _ = build_prompt(user_query, context['vector'], context['stats'], context['graph'])
 
         response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
             messages=[{"role": "user", "content": prompt}],
-            max_tokens=500,  # Limit response length for faster generation
-            temperature=0.3   # Lower temperature for more focused responses
+            **LLM_OPTIONS
         )
-        return response.choices[0].message.content
+        answer = response.choices[0].message.content
+        store_answer(cache_key, user_query, answer)
+        return answer
         
     except Exception as e:
         return f"<div style='color: red;'>Error processing query: {str(e)}</div>"
+
+def rag_query_stream(user_query):
+    """Streaming rag_query: yields (event, data) pairs.
+
+    'retrieval' (sources and timings) is yielded as soon as retrieval
+    finishes, then one 'token' per LLM delta, then 'done' (with prompt
+    token metrics); failures yield 'error'. A semantic cache hit yields an
+    empty 'retrieval' marked cached and the whole answer as a single 'token'.
+    """
+    start = time.perf_counter()
+    try:
+        answer, query_emb, id_chunks, cache_key = cached_answer(user_query)
+        if answer is not None:
+            yield 'retrieval', {
+                'sources': [],
+                'graph_records': 0,
+                'has_statistics': False,
+                'cached': True,
+                'retrieval_ms': round((time.perf_counter() - start) * 1000, 1),
+            }
+            yield 'token', {'text': answer}
+            yield 'done', {'total_ms': round((time.perf_counter() - start) * 1000, 1)}
+            return
+        context = retrieve_context(user_query, query_emb, id_chunks)
+        yield 'retrieval', {
+            'sources': [chunk[0] for chunk in context['vector']],
+            'graph_records': len(context['graph'] or []),
+            'has_statistics': bool(context['stats']),
+            'cached': False,
+            'retrieval_ms': round((time.perf_counter() - start) * 1000, 1),
+        }
+        prompt, prompt_metrics = build_prompt(user_query, context['vector'], context['stats'], context['graph'])
+        stream = client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+            **LLM_OPTIONS
+        )
+        tokens = []
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                tokens.append(chunk.choices[0].delta.content)
+                yield 'token', {'text': tokens[-1]}
+        store_answer(cache_key, user_query, ''.join(tokens))
+        yield 'done', {'total_ms': round((time.perf_counter() - start) * 1000, 1), 'prompt': prompt_metrics}
+    except Exception as e:
+        yield 'error', {'detail': f"Error processing query: {str(e)}"}
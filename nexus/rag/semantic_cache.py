@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+
+
+class SemanticCache:
+    """Answers to earlier questions, reused for paraphrases of the same question.
+
+    Callers pass query embeddings from the VectorStore's encoder, so the
+    same encoding serves retrieval on a miss. They are matched by cosine
+    similarity in a small in-memory FAISS index. An entry
+    only matches lookups with the same scope (e.g. the ids a question names),
+    since questions differing in one identifier embed almost identically.
+    Entries expire after ttl seconds, the least recently used are evicted
+    beyond max_entries, and everything is dropped when the data version
+    changes.
+    """
+
+    def __init__(self, threshold=0.9, ttl=3600, max_entries=1000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = None
+        self.index = None
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(embedding):
+        """L2-normalized (1, d) copy of an encoder output, for cosine similarity"""
+        vector = np.array(embedding, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _check_version(self, version):
+        if version != self.version:
+            self.version = version
+            self._entries.clear()
+            if self.index is not None:
+                self.index.reset()
+
+    def _remove(self, entry_id):
+        del self._entries[entry_id]
+        self.index.remove_ids(np.array([entry_id], dtype=np.int64))
+
+    def get(self, vector, version, scope=()):
+        """Return (answer, similarity) of the closest fresh entry of scope above threshold, else (None, similarity)"""
+        with self._lock:
+            self._check_version(version)
+            if not self._entries:
+                self.misses += 1
+                return None, 0.0
+            scores, ids = self.index.search(vector, min(16, len(self._entries)))
+            for score, entry_id in zip(scores[0].tolist(), ids[0].tolist()):
+                if score < self.threshold:
+                    break
+                if self._entries[entry_id][3] != scope:
+                    continue
+                if time.monotonic() - self._entries[entry_id][2] > self.ttl:
+                    self._remove(entry_id)
+                    continue
+                self._entries.move_to_end(entry_id)
+                self.hits += 1
+                return self._entries[entry_id][1], score
+            self.misses += 1
+            return None, float(scores[0][0])
+
+    def put(self, vector, query, answer, version, scope=()):
+        with self._lock:
+            self._check_version(version)
+            if self.index is None:
+                self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+            entry_id = self._next_id
+            self._next_id += 1
+            self.index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = (query, answer, time.monotonic(), scope)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
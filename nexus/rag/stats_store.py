@@ -0,0 +1,101 @@
+import hashlib
+import os
+import threading
+
+import pandas as pd
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+DATA_FILES = ['logistics', 'suppliers', 'returns', 'inventory']
+
+
+def compute_statistics(data):
+    """Aggregate the dataset frames into the figures served to prompts and the dashboard"""
+    logistics_df = data['logistics']
+    carriers = pd.DataFrame({
+        'total': logistics_df.groupby('carrier').size(),
+        'delayed': logistics_df[logistics_df['delayed'] == 'yes'].groupby('carrier').size(),
+    }).fillna(0).astype(int)
+    carriers['delay_rate'] = (carriers['delayed'] / carriers['total'] * 100).round(1)
+
+    suppliers = data['suppliers'].groupby('supplier_name').agg({
+        'on_time_rate': 'mean',
+        'return_rate': 'mean'
+    }).round(3)
+
+    returns_df = data['returns']
+    return_reasons = returns_df['return_reason'].value_counts()
+    total_returns = len(returns_df)
+    total_shipments = len(logistics_df)
+    return_rate = (total_returns / total_shipments * 100) if total_shipments > 0 else 0
+
+    return {
+        'carriers': carriers,
+        'suppliers': suppliers,
+        'return_reasons': return_reasons,
+        'total_shipments': total_shipments,
+        'total_returns': total_returns,
+        'return_rate': return_rate,
+        # Prompt-ready text, rendered once per data version
+        'sections': {
+            'carriers': [
+                f"Carrier Delay Counts:\n{carriers.loc[carriers['delayed'] > 0, 'delayed'].to_string()}",
+                f"Total Shipments per Carrier:\n{carriers['total'].to_string()}",
+            ],
+            'suppliers': [
+                f"Supplier Performance (Avg On-Time & Return Rates):\n{suppliers.to_string()}",
+            ],
+            'returns': [
+                f"Total Returns: {total_returns}",
+                f"Top Return Reasons:\n{return_reasons.head(10).to_string()}",
+                f"Return Rate: {return_rate:.1f}% ({total_returns} returns out of {total_shipments} shipments)",
+            ],
+        },
+    }
+
+
+class StatsStore:
+    """Dataset statistics computed once per version of the data files.
+
+    Every get() stats the CSVs; when a file's mtime or size moves, its
+    content hash is recomputed, and the statistics are rebuilt only if some
+    file's content actually changed. Results are shared, so callers must not
+    mutate them.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, files=DATA_FILES):
+        self.data_dir = data_dir
+        self.files = files
+        self.version = None
+        self._stats = None
+        self._signatures = {}
+        self._hashes = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def _path(self, name):
+        return os.path.join(self.data_dir, f'{name}.csv')
+
+    def _content_version(self):
+        """Content hashes of the data files, re-hashing only those whose mtime or size changed"""
+        for name in self.files:
+            stat = os.stat(self._path(name))
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if self._signatures.get(name) != signature:
+                with open(self._path(name), 'rb') as f:
+                    self._hashes[name] = hashlib.sha1(f.read()).hexdigest()
+                self._signatures[name] = signature
+        return tuple(self._hashes[name] for name in self.files)
+
+    def get(self):
+        """Current statistics, rebuilt first if the data files changed"""
+        with self._lock:
+            version = self._content_version()
+            if version != self.version:
+                data = {name: pd.read_csv(self._path(name)) for name in self.files}
+                self._stats = compute_statistics(data)
+                self.version = version
+                self.builds += 1
+            return self._stats
+
+
+stats_store = StatsStore()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test script for the streaming query endpoint (/api/query/stream)
+
+Start the server with the offline LLM so no API key is needed:
+    LLM_BACKEND=fake python api_server_light.py
+"""
+
+import requests
+import json
+import time
+
+def read_events(response):
+    """Parse a text/event-stream response into (event, data) pairs"""
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            yield event, json.loads(line[len("data: "):])
+
+def test_query_stream():
+    """Compare time-to-first-byte of /api/query/stream with the blocking /api/query"""
+    base_url = "http://localhost:8000"
+    query = "Which carrier has the most delayed shipments?"
+
+    print("🧪 Testing streaming query endpoint")
+    print("=" * 50)
+
+    try:
+        start = time.perf_counter()
+        response = requests.post(f"{base_url}/api/query", json={"query": query})
+        blocking_s = time.perf_counter() - start
+        print(f"✅ /api/query: {response.status_code} in {blocking_s:.2f}s")
+    except Exception as e:
+        print(f"❌ /api/query failed: {e}")
+
+    try:
+        start = time.perf_counter()
+        first_event_s = first_token_s = None
+        answer = []
+        with requests.post(f"{base_url}/api/query/stream", json={"query": query}, stream=True) as response:
+            print(f"\n✅ /api/query/stream: {response.status_code} ({response.headers.get('content-type')})")
+            for event, data in read_events(response):
+                elapsed = time.perf_counter() - start
+                if first_event_s is None:
+                    first_event_s = elapsed
+                    print(f"   First event '{event}' after {elapsed:.2f}s")
+                if event == "retrieval":
+                    print(f"   Sources: {len(data['sources'])}, graph records: {data['graph_records']}, "
+                          f"retrieval: {data['retrieval_ms']}ms")
+                elif event == "token":
+                    if first_token_s is None:
+                        first_token_s = elapsed
+                        print(f"   First token after {elapsed:.2f}s")
+                    answer.append(data["text"])
+                elif event == "done":
+                    print(f"   Done after {elapsed:.2f}s ({len(answer)} tokens)")
+                    if data.get("prompt"):
+                        print(f"   Prompt tokens: {data['prompt']['tokens_before']} -> "
+                              f"{data['prompt']['tokens_after']} (budget {data['prompt']['budget']})")
+                elif event == "error":
+                    print(f"❌ Stream error: {data['detail']}")
+        print(f"   Answer: {''.join(answer)[:200]}...")
+    except Exception as e:
+        print(f"❌ /api/query/stream failed: {e}")
+
+if __name__ == "__main__":
+    test_query_stream()
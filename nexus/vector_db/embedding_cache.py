@@ -0,0 +1,88 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+# SQLite caps the number of bound parameters per statement
+_CHUNK = 500
+
+
+class EmbeddingCache:
+    """On-disk embedding cache keyed by (model name, text hash).
+
+    Entries are evicted least-recently-used once the cache holds more than
+    max_entries vectors. The entry count is tracked in memory as an upper
+    bound (a put may replace an existing key) and only recounted once it
+    crosses max_entries.
+    """
+
+    def __init__(self, path, model_name, max_entries=500000):
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self.conn.commit()
+        self._count = self.conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).digest()
+
+    def get_many(self, texts):
+        """Return a list with a float32 vector, or None on a miss, for each text"""
+        keys = [self._key(t) for t in texts]
+        found = {}
+        for start in range(0, len(keys), _CHUNK):
+            chunk = keys[start:start + _CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            found.update(rows)
+            if rows:
+                self.conn.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(rows))})",
+                    [time.time_ns()] + [key for key, _ in rows],
+                )
+        self.conn.commit()
+        result = [np.frombuffer(found[k], dtype=np.float32) if k in found else None for k in keys]
+        self.hits += sum(1 for r in result if r is not None)
+        self.misses += sum(1 for r in result if r is None)
+        return result
+
+    def put_many(self, texts, vectors):
+        now = time.time_ns()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+            ((self._key(t), np.asarray(v, dtype=np.float32).tobytes(), now) for t, v in zip(texts, vectors)),
+        )
+        self.conn.commit()
+        self._count += len(texts)
+        if self._count > self.max_entries:
+            self.evict()
+
+    def evict(self):
+        """Drop least-recently-used entries beyond max_entries"""
+        count = self.conn.execute("SELECT count(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            self.conn.commit()
+        self._count = min(count, self.max_entries)
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,160 @@
+"""
+Sentence encoder backends for VectorStore.
+
+'pytorch' is the SentenceTransformer model. 'onnx' and 'onnx-int8' run an
+exported copy of the same model on ONNX Runtime (the latter with dynamically
+quantized int8 weights), which avoids importing torch and is faster on CPU.
+Export once with:
+
+    python -m vector_db.encoders --model paraphrase-MiniLM-L3-v2 --out vector_db/onnx_model
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+ENCODER_BACKENDS = ('pytorch', 'onnx', 'onnx-int8')
+ONNX_FILE = 'model.onnx'
+ONNX_INT8_FILE = 'model.int8.onnx'
+TOKENIZER_FILE = 'tokenizer.json'
+CONFIG_FILE = 'encoder_config.json'
+
+
+def load_encoder(backend, model_name, onnx_dir=None):
+    """Return an object with a SentenceTransformer-compatible encode()"""
+    if backend == 'pytorch':
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    if backend in ('onnx', 'onnx-int8'):
+        if not onnx_dir or not os.path.exists(os.path.join(onnx_dir, CONFIG_FILE)):
+            raise ValueError(f"No exported ONNX encoder in {onnx_dir}; run python -m vector_db.encoders first.")
+        return OnnxEncoder(onnx_dir, quantized=backend == 'onnx-int8')
+    raise ValueError(f"Unknown encoder backend '{backend}', expected one of {ENCODER_BACKENDS}")
+
+
+class OnnxEncoder:
+    """Tokenizer + ONNX transformer + pooling, matching the exported SentenceTransformer"""
+
+    def __init__(self, model_dir, quantized=False, num_threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, CONFIG_FILE)) as f:
+            self.config = json.load(f)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(self.config['max_seq_length'])
+        self.tokenizer.enable_padding(pad_id=self.config['pad_token_id'], pad_token=self.config['pad_token'])
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        model_file = ONNX_INT8_FILE if quantized else ONNX_FILE
+        self.session = ort.InferenceSession(os.path.join(model_dir, model_file), options,
+                                            providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def get_sentence_embedding_dimension(self):
+        return self.config['dim']
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        result = np.zeros((len(texts), self.config['dim']), dtype=np.float32)
+        # Longest first so each batch pads to similar lengths, as SentenceTransformer does
+        order = np.argsort([-len(t) for t in texts], kind='stable')
+        for start in range(0, len(texts), batch_size):
+            rows = order[start:start + batch_size]
+            encoded = self.tokenizer.encode_batch([texts[i] for i in rows])
+            mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+            feeds = {
+                'input_ids': np.array([e.ids for e in encoded], dtype=np.int64),
+                'attention_mask': mask,
+            }
+            if 'token_type_ids' in self.input_names:
+                feeds['token_type_ids'] = np.array([e.type_ids for e in encoded], dtype=np.int64)
+            hidden = self.session.run(None, feeds)[0]
+            result[rows] = self._pool(hidden, mask)
+        return result[0] if single else result
+
+    def _pool(self, hidden, mask):
+        if self.config['pooling'] == 'cls':
+            pooled = hidden[:, 0]
+        else:
+            weights = mask[:, :, None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        if self.config['normalize']:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled
+
+
+def export_onnx(model_name, output_dir, quantize=True, opset=17):
+    """Export a SentenceTransformer to ONNX (plus a dynamically quantized int8 copy)"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device='cpu')
+    transformer, pooling = model[0], model[1]
+    pooling_config = pooling.get_config_dict()
+    pooling_mode = pooling_config.get('pooling_mode') or (
+        'cls' if pooling_config.get('pooling_mode_cls_token') else 'mean')
+    if pooling_mode not in ('mean', 'cls'):
+        raise ValueError(f"Unsupported pooling mode for ONNX export: {pooling_mode}")
+    normalize = any(type(module).__name__ == 'Normalize' for module in model)
+    tokenizer = transformer.tokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer.backend_tokenizer.save(os.path.join(output_dir, TOKENIZER_FILE))
+
+    class HiddenStates(torch.nn.Module):
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.auto_model(input_ids=input_ids, attention_mask=attention_mask,
+                                   token_type_ids=token_type_ids).last_hidden_state
+
+    sample = tokenizer(["export sample"], return_tensors='pt')
+    token_type_ids = sample.get('token_type_ids', torch.zeros_like(sample['input_ids']))
+    axes = {0: 'batch', 1: 'sequence'}
+    torch.onnx.export(
+        HiddenStates(transformer.auto_model).eval(),
+        (sample['input_ids'], sample['attention_mask'], token_type_ids),
+        os.path.join(output_dir, ONNX_FILE),
+        input_names=['input_ids', 'attention_mask', 'token_type_ids'],
+        output_names=['last_hidden_state'],
+        dynamic_axes={'input_ids': axes, 'attention_mask': axes, 'token_type_ids': axes,
+                      'last_hidden_state': axes},
+        opset_version=opset,
+        dynamo=False,
+    )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(os.path.join(output_dir, ONNX_FILE), os.path.join(output_dir, ONNX_INT8_FILE),
+                         weight_type=QuantType.QInt8)
+
+    config = {
+        'model_name': model_name,
+        'dim': model.get_sentence_embedding_dimension(),
+        'max_seq_length': transformer.max_seq_length,
+        'pooling': pooling_mode,
+        'normalize': normalize,
+        'pad_token': tokenizer.pad_token,
+        'pad_token_id': tokenizer.pad_token_id,
+    }
+    with open(os.path.join(output_dir, CONFIG_FILE), 'w') as f:
+        json.dump(config, f, indent=2)
+    return config
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export a SentenceTransformer encoder to ONNX')
+    parser.add_argument('--model', default='paraphrase-MiniLM-L3-v2')
+    parser.add_argument('--out', default=os.path.join(os.path.dirname(__file__), 'onnx_model'))
+    parser.add_argument('--no-quantize', action='store_true')
+    args = parser.parse_args()
+    exported = export_onnx(args.model, args.out, quantize=not args.no_quantize)
+    print(f"Exported {args.model} ({exported['dim']} dims) to {args.out}")
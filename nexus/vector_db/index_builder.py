@@ -0,0 +1,280 @@
+import json
+import os
+import shutil
+from array import array
+
+import numpy as np
+import pandas as pd
+
+from vector_db.vector_store import MappedTexts
+
+
+# Unique keys are looked up by document id ({'doc_id': 'shipment:L0002'})
+# instead of being stored as metadata, which would add a posting list per row
+KEY_DOC_ID_PREFIXES = {
+    'supplier_id': 'supplier:',
+    'shipment_id': 'shipment:',
+    'return_id': 'return:',
+}
+
+
+def _as_text(col):
+    # Matches f"{value}" formatting, including 'nan' for missing values
+    return col.astype(str).fillna('nan')
+
+
+def _as_values(col):
+    return col.astype(object).where(col.notna(), None)
+
+
+def inventory_documents(df):
+    texts = ("Item: " + _as_text(df['item_name']) + " (Stock: " + _as_text(df['stock'])
+             + ", Demand: " + _as_text(df['predicted_demand_next_week']) + ")")
+    ids = "item:" + _as_text(df['item_id'])
+    metadata = pd.DataFrame({
+        'type': 'item',
+        'item_id': _as_values(df['item_id']),
+        'warehouse_id': _as_values(df['warehouse_id']),
+    })
+    return ids, texts, metadata
+
+
+def supplier_documents(df):
+    texts = ("Supplier: " + _as_text(df['supplier_name']) + " (On-time: " + _as_text(df['on_time_rate'])
+             + ", Return rate: " + _as_text(df['return_rate']) + ")")
+    ids = KEY_DOC_ID_PREFIXES['supplier_id'] + _as_text(df['supplier_id'])
+    metadata = pd.DataFrame({
+        'type': 'supplier',
+        'supplier': _as_values(df['supplier_name']),
+        'item_id': _as_values(df['item_id']),
+    })
+    return ids, texts, metadata
+
+
+def logistics_documents(df):
+    texts = ("Shipment: " + _as_text(df['shipment_id']) + " for Item " + _as_text(df['item_id'])
+             + " via " + _as_text(df['carrier']) + " (Delayed: " + _as_text(df['delayed'])
+             + ", Reason: " + _as_text(df['delay_reason']) + ")")
+    ids = KEY_DOC_ID_PREFIXES['shipment_id'] + _as_text(df['shipment_id'])
+    metadata = pd.DataFrame({
+        'type': 'shipment',
+        'item_id': _as_values(df['item_id']),
+        'carrier': _as_values(df['carrier']),
+        'delayed': _as_values(df['delayed']),
+    })
+    return ids, texts, metadata
+
+
+def returns_documents(df):
+    texts = ("Return: " + _as_text(df['return_id']) + " for Item " + _as_text(df['item_id'])
+             + " by Customer " + _as_text(df['customer_id']) + " (Reason: " + _as_text(df['return_reason'])
+             + ", Date: " + _as_text(df['date']) + ")")
+    ids = KEY_DOC_ID_PREFIXES['return_id'] + _as_text(df['return_id'])
+    metadata = pd.DataFrame({
+        'type': 'return',
+        'item_id': _as_values(df['item_id']),
+        'date': _as_values(df['date']),
+    })
+    return ids, texts, metadata
+
+
+def iter_documents(tables, chunksize=50000):
+    """Yield (ids, texts, metadata) lists per CSV chunk.
+
+    tables is a list of (csv_path, documents_fn) pairs, read in order.
+    """
+    for path, documents_fn in tables:
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            ids, texts, metadata = documents_fn(chunk)
+            records = [{k: v for k, v in row.items() if v is not None}
+                       for row in metadata.to_dict('records')]
+            yield ids.tolist(), texts.tolist(), records
+
+
+def _append_strings(blob_file, offsets_file, strings, end):
+    """Append strings to a raw UTF-8 blob and int64 offsets file; returns the new end offset"""
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = end + np.cumsum([len(b) for b in encoded], dtype=np.int64)
+    blob_file.write(b''.join(encoded))
+    offsets_file.write(offsets.tobytes())
+    return int(offsets[-1]) if len(offsets) else end
+
+
+class StreamingIndexBuilder:
+    """Builds a VectorStore index in fixed-size batches with resumable checkpoints.
+
+    Texts, doc ids, metadata and embeddings are appended to raw files in
+    work_dir and only the FAISS index is held in memory. A checkpoint is
+    written after every batch, so a crashed build restarted with the same
+    inputs and settings skips the rows it already encoded.
+    """
+
+    def __init__(self, store, work_dir, batch_size=1024):
+        self.store = store
+        self.work_dir = work_dir
+        self.batch_size = batch_size
+        self.rows = 0
+        self.text_end = 0
+        self.id_end = 0
+        self.dim = None
+        self._done = False
+
+    def _path(self, name):
+        return os.path.join(self.work_dir, name)
+
+    def _config(self, inputs):
+        return {
+            'model_name': self.store.model_name,
+            'encoder_backend': self.store.encoder_backend,
+            'index_type': self.store.index_type,
+            'inputs': [[os.path.abspath(p), os.path.getsize(p), os.path.getmtime(p)] for p in inputs],
+        }
+
+    def _restore(self, config):
+        """Resume from the last checkpoint if it was made with the same config"""
+        try:
+            with open(self._path('progress.json')) as f:
+                progress = json.load(f)
+        except (OSError, ValueError):
+            progress = None
+        if progress is None or progress['config'] != config:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+            os.makedirs(self.work_dir)
+            for name in ('texts.bin', 'doc_ids.bin', 'embeddings.f32', 'metadata.jsonl'):
+                open(self._path(name), 'wb').close()
+            for name in ('text_offsets.i64', 'doc_id_offsets.i64'):
+                with open(self._path(name), 'wb') as f:
+                    f.write(np.zeros(1, dtype=np.int64).tobytes())
+            return
+
+        self.rows = progress['rows']
+        self.text_end = progress['text_end']
+        self.id_end = progress['id_end']
+        self.dim = progress['dim']
+        # Drop anything written after the last checkpoint
+        sizes = {
+            'texts.bin': self.text_end,
+            'doc_ids.bin': self.id_end,
+            'text_offsets.i64': (self.rows + 1) * 8,
+            'doc_id_offsets.i64': (self.rows + 1) * 8,
+            'embeddings.f32': self.rows * (self.dim or 0) * 4,
+            'metadata.jsonl': progress['metadata_end'],
+        }
+        for name, size in sizes.items():
+            with open(self._path(name), 'r+b') as f:
+                f.truncate(size)
+        print(f"Resuming index build from checkpoint at row {self.rows}.")
+
+    def _checkpoint(self, config, files):
+        for f in files.values():
+            f.flush()
+            os.fsync(f.fileno())
+        progress = {
+            'config': config,
+            'rows': self.rows,
+            'text_end': self.text_end,
+            'id_end': self.id_end,
+            'metadata_end': files['metadata'].tell(),
+            'dim': self.dim,
+        }
+        with open(self._path('progress.json.tmp'), 'w') as f:
+            json.dump(progress, f)
+        os.replace(self._path('progress.json.tmp'), self._path('progress.json'))
+
+    def _embeddings(self):
+        if not self.rows:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.memmap(self._path('embeddings.f32'), dtype=np.float32, mode='r', shape=(self.rows, self.dim))
+
+    def _add_to_index(self, start, end):
+        """Add embeddings rows [start, end) from disk, creating the index when possible"""
+        store = self.store
+        if end == 0:
+            return
+        if store.index is None:
+            embeddings = self._embeddings()
+            # Trained index types wait until a full training sample is on disk
+            if store.index_type not in ('flat', 'hnsw') and end < store.train_size and not self._done:
+                return
+            store.index = store._create_index(embeddings[:max(end, 1)])
+            start = 0
+        embeddings = self._embeddings()
+        for s in range(start, end, self.batch_size):
+            e = min(s + self.batch_size, end)
+            store.index.add_with_ids(np.ascontiguousarray(embeddings[s:e]), np.arange(s, e, dtype=np.int64))
+
+    def build(self, inputs, batches):
+        """Encode (ids, texts, metadata) batches into the index, resuming if possible.
+
+        inputs are the source file paths, used to tell whether a checkpoint
+        still matches the data.
+        """
+        config = self._config(inputs)
+        self._restore(config)
+        self._done = False
+        self.store.index = None
+        self._add_to_index(0, self.rows)
+        skip = self.rows
+
+        files = {
+            'texts': open(self._path('texts.bin'), 'ab'),
+            'text_offsets': open(self._path('text_offsets.i64'), 'ab'),
+            'doc_ids': open(self._path('doc_ids.bin'), 'ab'),
+            'doc_id_offsets': open(self._path('doc_id_offsets.i64'), 'ab'),
+            'embeddings': open(self._path('embeddings.f32'), 'ab'),
+            'metadata': open(self._path('metadata.jsonl'), 'ab'),
+        }
+        try:
+            for ids, texts, metadata in batches:
+                if skip >= len(ids):
+                    skip -= len(ids)
+                    continue
+                ids, texts, metadata = ids[skip:], texts[skip:], metadata[skip:]
+                skip = 0
+                for s in range(0, len(ids), self.batch_size):
+                    e = s + self.batch_size
+                    embs = self.store._encode(texts[s:e])
+                    self.dim = embs.shape[1]
+                    files['embeddings'].write(embs.tobytes())
+                    self.text_end = _append_strings(files['texts'], files['text_offsets'], texts[s:e], self.text_end)
+                    self.id_end = _append_strings(files['doc_ids'], files['doc_id_offsets'], ids[s:e], self.id_end)
+                    files['metadata'].write(''.join(json.dumps(m) + '\n' for m in metadata[s:e]).encode('utf-8'))
+                    start = self.rows
+                    self.rows += len(embs)
+                    self._checkpoint(config, files)
+                    self._add_to_index(start, self.rows)
+                print(f"Encoded {self.rows} documents...")
+        finally:
+            for f in files.values():
+                f.close()
+        self._done = True
+        if self.rows == 0:
+            raise ValueError("No documents to index.")
+        if self.store.index is None:
+            self._add_to_index(0, self.rows)
+
+    def finalize(self, path):
+        """Save the built index to path in the VectorStore format and drop the checkpoint"""
+        store = self.store
+        text_offsets = np.fromfile(self._path('text_offsets.i64'), dtype=np.int64)
+        id_offsets = np.fromfile(self._path('doc_id_offsets.i64'), dtype=np.int64)
+        store.texts = MappedTexts(self._raw_blob('texts.bin'), text_offsets)
+        store.doc_ids = MappedTexts(self._raw_blob('doc_ids.bin'), id_offsets)
+        store.embeddings = self._embeddings()
+        # Posting lists are accumulated as compact int64 arrays, 8 bytes per row and field
+        postings = {}
+        with open(self._path('metadata.jsonl'), 'rb') as f:
+            for row, line in enumerate(f):
+                for field, value in json.loads(line).items():
+                    postings.setdefault(field, {}).setdefault(str(value), array('q')).append(row)
+        store.postings = {
+            field: {value: np.frombuffer(rows, dtype=np.int64) for value, rows in by_value.items()}
+            for field, by_value in postings.items()
+        }
+        store.save_index(path)
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _raw_blob(self, name):
+        if os.path.getsize(self._path(name)) == 0:
+            return np.zeros(0, dtype=np.uint8)
+        return np.memmap(self._path(name), dtype=np.uint8, mode='r')
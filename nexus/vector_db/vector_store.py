@@ -1,36 +1,751 @@
-import pandas as pd
-from sentence_transformers import SentenceTransformer
+import json
+import os
+import pickle
+import shutil
+
 import faiss
 import numpy as np
-import pickle
+import pandas as pd
+
+from vector_db.encoders import ENCODER_BACKENDS, load_encoder
+
+# On-disk layout of a saved index directory
+INDEX_FILE = 'index.faiss'
+EMBEDDINGS_FILE = 'embeddings.npy'
+TEXTS_FILE = 'texts.npy'
+OFFSETS_FILE = 'offsets.npy'
+DOC_IDS_FILE = 'doc_ids.npy'
+DOC_ID_OFFSETS_FILE = 'doc_id_offsets.npy'
+DOC_ID_HASHES_FILE = 'doc_id_hashes.npy'
+DOC_ID_ROWS_FILE = 'doc_id_rows.npy'
+FILTER_INDEX_FILE = 'filter_index.json'
+FILTER_ROWS_FILE = 'filter_rows.npy'
+META_FILE = 'meta.json'
+FORMAT_VERSION = 2
+SUPPORTED_FORMATS = (1, 2)
+
+
+class MappedTexts:
+    """Read-only sequence of strings backed by a memory-mapped UTF-8 blob"""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("text index out of range")
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def _save_strings(path, blob_file, offsets_file, strings):
+    """Store strings as one UTF-8 blob plus int64 offsets (see MappedTexts)"""
+    if isinstance(strings, MappedTexts):
+        # Already in this layout; copy through without decoding
+        np.save(os.path.join(path, blob_file), np.asarray(strings.blob, dtype=np.uint8))
+        np.save(os.path.join(path, offsets_file), np.asarray(strings.offsets, dtype=np.int64))
+        return
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    np.save(os.path.join(path, blob_file), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    np.save(os.path.join(path, offsets_file), offsets)
+
+
+def _is_missing(value):
+    return value is None or value == '' or (isinstance(value, float) and np.isnan(value))
+
+
+def _load_strings(path, blob_file, offsets_file, mmap_mode):
+    offsets = np.load(os.path.join(path, offsets_file), mmap_mode=mmap_mode)
+    # An empty blob cannot be memory-mapped
+    blob = np.load(os.path.join(path, blob_file), mmap_mode=mmap_mode if offsets[-1] > 0 else None)
+    return MappedTexts(blob, offsets)
+
+
+# flat/ivf/hnsw keep full float32 vectors; pq, sq8 and ivfpq store compressed codes
+INDEX_TYPES = ('flat', 'ivf', 'hnsw', 'pq', 'sq8', 'ivfpq')
+COMPRESSED_INDEX_TYPES = ('pq', 'sq8', 'ivfpq')
+
+
+class EncoderMismatchError(ValueError):
+    """A saved index was encoded by a different model or encoder backend"""
+
 
 class VectorStore:
-    def __init__(self, model_name='paraphrase-MiniLM-L3-v2'):
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name='paraphrase-MiniLM-L3-v2', index_type='flat', nlist=None,
+                 hnsw_m=32, ef_construction=80, pq_m=None, train_size=100000, rerank_factor=1,
+                 embedding_cache=None, exact_filter_limit=50000, encoder_backend='pytorch', onnx_dir=None,
+                 max_stale_fraction=0.1):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index_type '{index_type}', expected one of {INDEX_TYPES}")
+        if encoder_backend not in ENCODER_BACKENDS:
+            raise ValueError(f"Unknown encoder_backend '{encoder_backend}', expected one of {ENCODER_BACKENDS}")
+        self.model_name = model_name
+        # 'pytorch' (SentenceTransformer), or 'onnx' / 'onnx-int8' from an export in onnx_dir
+        self.encoder_backend = encoder_backend
+        self.onnx_dir = onnx_dir
+        self.index_type = index_type
+        self.nlist = nlist
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.pq_m = pq_m
+        self.train_size = train_size
+        self.rerank_factor = rerank_factor
+        # Optional EmbeddingCache consulted before encoding documents
+        self.embedding_cache = embedding_cache
+        # Filtered searches over at most this many rows are scored exactly
+        self.exact_filter_limit = exact_filter_limit
+        self._model = None
         self.index = None
+        # Row-aligned state: FAISS ids are row numbers into texts/doc_ids/embeddings
         self.texts = []
+        self.doc_ids = None
+        # Exact vectors; a read-only memmap after load_index, used for saving and re-ranking
         self.embeddings = None
+        # Vectors upserted since build/load, rows len(embeddings)..; joined on save
+        self._added_embeddings = []
+        self._row_of = None
+        # Sorted doc id hashes and their rows, for id lookups without a dict
+        self._doc_id_hashes = None
+        self._doc_id_rows = None
+        # Metadata posting lists: field -> value -> sorted int64 rows
+        self.postings = {}
+        # Deleted rows still inside an index that cannot remove vectors (HNSW)
+        self._stale_rows = 0
+        self._dead_rows = None
+        # The HNSW graph is rebuilt once deleted rows exceed this share of it
+        self.max_stale_fraction = max_stale_fraction
+        self._read_only = False
+
+    @property
+    def model(self):
+        """Load the encoder on first use so index-only work stays cheap"""
+        if self._model is None:
+            self._model = load_encoder(self.encoder_backend, self.model_name, self.onnx_dir)
+        return self._model
+
+    def _encode(self, texts, show_progress_bar=False):
+        """Encode documents as float32, reusing cached embeddings where available"""
+        if self.embedding_cache is None:
+            return np.ascontiguousarray(self.model.encode(texts, show_progress_bar=show_progress_bar), dtype=np.float32)
+
+        cached = self.embedding_cache.get_many(texts)
+        missing = [i for i, vec in enumerate(cached) if vec is None]
+        if missing:
+            new_texts = [texts[i] for i in missing]
+            new_embs = np.asarray(self.model.encode(new_texts, show_progress_bar=show_progress_bar), dtype=np.float32)
+            self.embedding_cache.put_many(new_texts, new_embs)
+            for i, vec in zip(missing, new_embs):
+                cached[i] = vec
+        if not cached:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.ascontiguousarray(np.vstack(cached), dtype=np.float32)
+
+    def build_index(self, texts, ids=None, metadata=None):
+        """Encode texts and build a fresh index.
+
+        ids are optional stable document ids (e.g. 'shipment:L0002'), one per
+        text; they are required for upsert(), delete() and sync(). metadata is
+        an optional list of dicts (e.g. {'carrier': 'CarrierA'}) used by
+        filtered searches.
+        """
+        if ids is not None:
+            ids = [str(i) for i in ids]
+            if len(ids) != len(texts):
+                raise ValueError("ids and texts must have the same length")
+            if len(set(ids)) != len(ids):
+                raise ValueError("Document ids must be unique")
+        self.texts = list(texts)
+        self.doc_ids = ids
+        self._row_of = None
+        self._doc_id_hashes = self._doc_id_rows = None
+        self.postings = {}
+        if metadata is not None:
+            self._add_postings(metadata, 0)
+        self._stale_rows = 0
+        self._dead_rows = None
+        self._read_only = False
+        self.embeddings = self._encode(self.texts, show_progress_bar=True)
+        self._added_embeddings = []
+        self.index = self._create_index(self.embeddings)
+        self.index.add_with_ids(self.embeddings, np.arange(len(self.texts), dtype=np.int64))
+
+    def _create_index(self, embeddings):
+        """Create an empty (trained) FAISS index of the configured type"""
+        n, dim = embeddings.shape
+        # IVF: ~4*sqrt(n) lists, but keep at least 39 training points per list
+        nlist = self.nlist or int(4 * np.sqrt(max(n, 1)))
+        nlist = max(1, min(nlist, n // 39 or 1))
+        # PQ: dim/4 one-byte sub-quantizers is 16x smaller than float32
+        pq_m = self.pq_m or max(1, dim // 4)
+
+        # Non-IVF indexes are wrapped in an id map so ids stay row numbers after deletes
+        if self.index_type == 'flat':
+            return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+        if self.index_type == 'hnsw':
+            index = faiss.IndexHNSWFlat(dim, self.hnsw_m)
+            index.hnsw.efConstruction = self.ef_construction
+            return faiss.IndexIDMap2(index)
+        if self.index_type == 'ivf':
+            index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, nlist)
+        elif self.index_type == 'ivfpq':
+            index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, nlist, pq_m, 8)
+        elif self.index_type == 'pq':
+            index = faiss.IndexPQ(dim, pq_m, 8)
+        else:
+            index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit)
+
+        if n > self.train_size:
+            sample = np.random.default_rng(0).choice(n, self.train_size, replace=False)
+            index.train(np.ascontiguousarray(embeddings[np.sort(sample)], dtype=np.float32))
+        else:
+            index.train(np.ascontiguousarray(embeddings, dtype=np.float32))
+        if self.index_type in ('pq', 'sq8'):
+            return faiss.IndexIDMap2(index)
+        return index
+
+    def set_search_params(self, nprobe=None, ef_search=None, rerank_factor=None):
+        """Tune the speed/recall trade-off: IVF nprobe, HNSW efSearch and exact re-ranking.
+
+        rerank_factor > 1 fetches top_k * rerank_factor candidates from the
+        index and re-orders them by exact distance, which recovers most of the
+        recall lost to PQ/SQ8 compression.
+        """
+        if self.index is None:
+            raise ValueError("Vector index is not loaded. Call load_index() first.")
+        params = faiss.ParameterSpace()
+        if nprobe is not None and self.index_type in ('ivf', 'ivfpq'):
+            params.set_index_parameter(self.index, 'nprobe', int(nprobe))
+        if ef_search is not None and self.index_type == 'hnsw':
+            params.set_index_parameter(self.index, 'efSearch', int(ef_search))
+        if rerank_factor is not None:
+            self.rerank_factor = max(1, int(rerank_factor))
+
+    def _exact_vectors(self):
+        """Exact float32 vectors for every row, without keeping a second copy around"""
+        if self.embeddings is not None:
+            return self.embeddings
+        if isinstance(self.index, faiss.IndexFlat):
+            return self.index.reconstruct_n(0, self.index.ntotal)
+        raise ValueError("Exact embeddings are not available for this index.")
+
+    def _save_embeddings(self, path, chunk_rows=65536):
+        """Write the base vectors and the upserted blocks to one .npy, a chunk at a time"""
+        blocks = [self._exact_vectors()] + self._added_embeddings
+        rows = sum(len(block) for block in blocks)
+        if rows == 0:
+            np.save(os.path.join(path, EMBEDDINGS_FILE), np.zeros((0, self.index.d), dtype=np.float32))
+            return
+        out = np.lib.format.open_memmap(os.path.join(path, EMBEDDINGS_FILE), mode='w+',
+                                        dtype=np.float32, shape=(rows, self.index.d))
+        row = 0
+        for block in blocks:
+            for start in range(0, len(block), chunk_rows):
+                part = block[start:start + chunk_rows]
+                out[row:row + len(part)] = part
+                row += len(part)
+        out.flush()
+        del out
+
+    def _save_doc_id_index(self, path, chunk_rows=1000000):
+        """Write live rows sorted by doc id hash, so lookups binary-search a memmap"""
+        hashes = np.zeros(len(self.doc_ids), dtype=np.uint64)
+        for start in range(0, len(self.doc_ids), chunk_rows):
+            ids = np.asarray(self.doc_ids[start:start + chunk_rows], dtype=object)
+            hashes[start:start + len(ids)] = pd.util.hash_array(ids)
+        rows = np.flatnonzero(self._live_mask(np.arange(len(self.doc_ids), dtype=np.int64)))
+        rows = rows[np.argsort(hashes[rows], kind='stable')]
+        np.save(os.path.join(path, DOC_ID_HASHES_FILE), hashes[rows])
+        np.save(os.path.join(path, DOC_ID_ROWS_FILE), rows.astype(np.int64))
+
+    def _doc_rows(self, doc_ids):
+        """Sorted live rows of the given document ids; unknown ids are ignored"""
+        doc_ids = [str(doc_id) for doc_id in doc_ids]
+        if self.doc_ids is None or not doc_ids:
+            return np.zeros(0, dtype=np.int64)
+        if self._row_of is not None or self._doc_id_hashes is None:
+            # Edited or never saved: the id -> row map is current
+            row_of = self._rows()
+            return np.unique(np.array([row_of[d] for d in doc_ids if d in row_of], dtype=np.int64))
+        keys = pd.util.hash_array(np.asarray(doc_ids, dtype=object))
+        starts = np.searchsorted(self._doc_id_hashes, keys, side='left')
+        ends = np.searchsorted(self._doc_id_hashes, keys, side='right')
+        rows = []
+        for doc_id, lo, hi in zip(doc_ids, starts, ends):
+            # Equal hashes are checked against the id itself
+            rows.extend(int(row) for row in self._doc_id_rows[lo:hi] if self.doc_ids[row] == doc_id)
+        return np.unique(np.array(rows, dtype=np.int64))
+
+    def save_index(self, path):
+        """Save the index as native FAISS plus memory-mappable sidecars.
+
+        Files are written to a staging directory that then replaces path, so
+        readers never see a mix of old and new files.
+        """
+        if self.index is None:
+            raise ValueError("Vector index is not built. Call build_index() first.")
+        staging = f"{path.rstrip(os.sep)}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        _save_strings(staging, TEXTS_FILE, OFFSETS_FILE, self.texts)
+        if self.doc_ids is not None:
+            _save_strings(staging, DOC_IDS_FILE, DOC_ID_OFFSETS_FILE, self.doc_ids)
+            self._save_doc_id_index(staging)
+        self._save_embeddings(staging)
+        if self.postings:
+            self._save_postings(staging)
+        faiss.write_index(self.index, os.path.join(staging, INDEX_FILE))
+        meta = {
+            'format_version': FORMAT_VERSION,
+            'model_name': self.model_name,
+            'encoder_backend': self.encoder_backend,
+            'index_type': self.index_type,
+            'count': len(self.texts),
+            'dim': int(self.index.d),
+            'has_doc_ids': self.doc_ids is not None,
+            'has_doc_id_index': self.doc_ids is not None,
+            'has_filters': bool(self.postings),
+            'stale_rows': self._stale_rows,
+        }
+        with open(os.path.join(staging, META_FILE), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+        previous = f"{path.rstrip(os.sep)}.old"
+        shutil.rmtree(previous, ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, previous)
+        os.replace(staging, path)
+        shutil.rmtree(previous, ignore_errors=True)
 
-    def build_index(self, texts):
-        self.texts = texts
-        self.embeddings = self.model.encode(texts, show_progress_bar=True)
-        dim = self.embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dim)
-        self.index.add(np.array(self.embeddings, dtype=np.float32))
+    def load_index(self, path, mmap=True):
+        """Load a saved index directory, or a legacy vector_index.pkl file.
 
-    def load_index(self, path):
+        With mmap=True the FAISS codes, embeddings and texts are mapped
+        read-only from disk, so loading does not copy data and several
+        worker processes share the same page-cache pages. The exact
+        embeddings are always mapped rather than read, since they are only
+        touched when saving or re-ranking a handful of candidates. Load with
+        mmap=False to upsert or delete documents.
+
+        Raises EncoderMismatchError if the index was encoded with another
+        model_name or encoder_backend, whose query vectors would not match.
+        """
+        if os.path.isfile(path):
+            return self._load_pickle(path)
+
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        if meta.get('format_version') not in SUPPORTED_FORMATS:
+            raise ValueError(f"Unsupported vector index format: {meta.get('format_version')}")
+        # Indexes saved before encoder backends existed were encoded with pytorch
+        encoded_with = (meta.get('model_name'), meta.get('encoder_backend', 'pytorch'))
+        if encoded_with != (self.model_name, self.encoder_backend):
+            raise EncoderMismatchError(
+                f"Vector index at {path} was encoded with {encoded_with[0]} ({encoded_with[1]}), "
+                f"not {self.model_name} ({self.encoder_backend})")
+
+        self.index_type = meta.get('index_type', 'flat')
+        mmap_mode = 'r' if mmap else None
+        io_flags = 0
+        if mmap:
+            io_flags = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        self.index = faiss.read_index(os.path.join(path, INDEX_FILE), io_flags)
+        self.embeddings = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode='r')
+        self._added_embeddings = []
+        self.texts = _load_strings(path, TEXTS_FILE, OFFSETS_FILE, mmap_mode)
+        self.doc_ids = None
+        if meta.get('has_doc_ids'):
+            self.doc_ids = _load_strings(path, DOC_IDS_FILE, DOC_ID_OFFSETS_FILE, mmap_mode)
+        self._row_of = None
+        self._doc_id_hashes = self._doc_id_rows = None
+        if meta.get('has_doc_id_index'):
+            self._doc_id_hashes = np.load(os.path.join(path, DOC_ID_HASHES_FILE), mmap_mode=mmap_mode)
+            self._doc_id_rows = np.load(os.path.join(path, DOC_ID_ROWS_FILE), mmap_mode=mmap_mode)
+        self.postings = {}
+        if meta.get('has_filters'):
+            self._load_postings(path, mmap_mode)
+        self._stale_rows = meta.get('stale_rows', 0)
+        self._dead_rows = None
+        self._read_only = mmap
+
+        rows = {len(self.texts), len(self.embeddings), meta['count']}
+        if self.doc_ids is not None:
+            rows.add(len(self.doc_ids))
+        if len(rows) != 1:
+            raise ValueError(f"Vector index at {path} is inconsistent: row counts {sorted(rows)}")
+        print(f"Loaded vector index with {len(self.texts)} texts.")
+
+    def _load_pickle(self, path):
+        """Legacy format: unpickle texts/embeddings and rebuild a flat index"""
         with open(path, 'rb') as f:
             data = pickle.load(f)
             self.texts = data['texts']
-            self.embeddings = data['embeddings']
-            dim = self.embeddings.shape[1]
-            self.index = faiss.IndexFlatL2(dim)
-            self.index.add(np.array(self.embeddings, dtype=np.float32))
+            embeddings = np.ascontiguousarray(data['embeddings'], dtype=np.float32)
+            self.index_type = 'flat'
+            self.index = faiss.IndexFlatL2(embeddings.shape[1])
+            self.index.add(embeddings)
+            # The flat index already holds every vector; don't keep a second copy
+            self.embeddings = None
+            self._added_embeddings = []
+            self.doc_ids = None
+            self._row_of = None
+            self._doc_id_hashes = self._doc_id_rows = None
+            self.postings = {}
+            self._stale_rows = 0
+            self._dead_rows = None
+            self._read_only = False
         print(f"Loaded vector index with {len(self.texts)} texts.")
 
-    def search(self, query, top_k=5):
+    def search(self, query, top_k=5, filters=None):
+        return self.search_batch([query], top_k, filters=filters)[0]
+
+    def search_batch(self, queries, top_k=5, batch_size=64, filters=None):
+        """Search many queries with one encode call and one FAISS search.
+
+        filters restricts candidates by metadata before scoring, e.g.
+        {'carrier': 'CarrierA'} or {'type': 'return', 'item_id': ['1003', '1004']}:
+        fields are ANDed, listed values ORed. Returns one list of
+        (text, distance) tuples per query, in input order.
+        """
+        if self.index is None:
+            raise ValueError("Vector index is not loaded. Call load_index() first.")
+        if len(queries) == 0:
+            return []
+        query_embs = self.model.encode(list(queries), batch_size=batch_size)
+        return self.search_vectors(query_embs, top_k, filters=filters)
+
+    def search_vectors(self, query_embs, top_k=5, filters=None):
+        """search_batch for queries already encoded with self.model, one row per query"""
+        if self.index is None:
+            raise ValueError("Vector index is not loaded. Call load_index() first.")
+        query_embs = np.ascontiguousarray(query_embs, dtype=np.float32).reshape(-1, self.index.d)
+        if filters:
+            rows = self._filter_rows(filters)
+            if len(rows) == 0:
+                return [[] for _ in query_embs]
+            if self.embeddings is not None and len(rows) <= self.exact_filter_limit:
+                D, I = self._search_rows(query_embs, rows, top_k)
+            elif self.index_type == 'pq':
+                D, I = self._search_decoded(query_embs, rows, top_k)
+            else:
+                params, selector = self._selector_params(rows)
+                D, I = self.index.search(query_embs, top_k, params=params)
+        else:
+            # Deleted rows an HNSW graph still holds are skipped during the search
+            params, selector = self._live_params()
+            if self.rerank_factor > 1 and self.embeddings is not None:
+                D, I = self._search_reranked(query_embs, top_k, params)
+            else:
+                D, I = self.index.search(query_embs, top_k, params=params)
+        return [
+            [(self.texts[i], float(d)) for d, i in zip(D[row], I[row]) if i >= 0 and self._is_live(i)][:top_k]
+            for row in range(len(I))
+        ]
+
+    def _is_live(self, row):
+        return self._stale_rows == 0 or self.doc_ids[row] != ''
+
+    def _live_mask(self, rows):
+        if self.doc_ids is None:
+            return np.ones(len(rows), dtype=bool)
+        if isinstance(self.doc_ids, MappedTexts):
+            # Deleted rows have an empty doc id, i.e. a zero-length slice
+            offsets = self.doc_ids.offsets
+            return (offsets[rows + 1] - offsets[rows]) > 0
+        return np.fromiter((self.doc_ids[r] != '' for r in rows), dtype=bool, count=len(rows))
+
+    def filter_values(self, field):
+        """Distinct values recorded for a metadata field"""
+        return list(self.postings.get(field, {}))
+
+    def lookup(self, filters, limit=None):
+        """Exact metadata match without encoding, e.g. {'doc_id': 'shipment:L0002'}.
+
+        Returns (text, 0.0) tuples in index order, like search() results.
+        """
+        rows = self._filter_rows(filters)
+        if limit is not None:
+            rows = rows[:limit]
+        return [(self.texts[i], 0.0) for i in rows]
+
+    def _filter_rows(self, filters):
+        """Resolve a filter dict to the sorted live rows matching it.
+
+        The field 'doc_id' matches document ids, for unique keys that would
+        bloat the posting lists with one entry per row.
+        """
+        empty = np.zeros(0, dtype=np.int64)
+        result = None
+        for field, wanted in filters.items():
+            values = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            if field == 'doc_id':
+                rows = self._doc_rows(values)
+            else:
+                by_value = self.postings.get(field, {})
+                rows = np.unique(np.concatenate([by_value.get(str(v), empty) for v in values] or [empty]))
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+            if len(result) == 0:
+                return empty
+        return result[self._live_mask(result)]
+
+    def _search_rows(self, query_embs, rows, top_k):
+        """Exact search restricted to rows; cost grows with len(rows), not the index"""
+        return self._nearest(query_embs, self._vectors(rows), rows, top_k)
+
+    def _search_decoded(self, query_embs, rows, top_k, chunk_rows=65536):
+        """Filtered search on IndexPQ, which accepts no IDSelector.
+
+        Scores the rows' decoded PQ codes a chunk at a time, which gives the
+        same distances a selector-restricted PQ search would.
+        """
+        D = np.zeros((len(query_embs), 0), dtype=np.float32)
+        I = np.zeros((len(query_embs), 0), dtype=np.int64)
+        for start in range(0, len(rows), chunk_rows):
+            ids = rows[start:start + chunk_rows]
+            d, i = self._nearest(query_embs, self.index.reconstruct_batch(ids), ids, top_k)
+            D, I = np.hstack([D, d]), np.hstack([I, i])
+            best = np.argsort(D, axis=1, kind='stable')[:, :top_k]
+            D, I = np.take_along_axis(D, best, axis=1), np.take_along_axis(I, best, axis=1)
+        return D, I
+
+    @staticmethod
+    def _nearest(query_embs, vecs, rows, top_k):
+        """Squared L2 top_k of query_embs among vecs, labelled with rows"""
+        dists = ((query_embs ** 2).sum(axis=1)[:, None] - 2 * query_embs @ vecs.T
+                 + (vecs ** 2).sum(axis=1)[None, :])
+        k = min(top_k, len(rows))
+        best = np.argpartition(dists, k - 1, axis=1)[:, :k]
+        best = np.take_along_axis(best, np.argsort(np.take_along_axis(dists, best, axis=1), axis=1), axis=1)
+        return np.maximum(np.take_along_axis(dists, best, axis=1), 0), rows[best]
+
+    def _selector_params(self, rows):
+        """FAISS search parameters restricting a search to rows.
+
+        The selector is returned too: it must stay referenced while searching.
+        """
+        selector = faiss.IDSelectorBatch(np.ascontiguousarray(rows, dtype=np.int64))
+        if self.index_type in ('ivf', 'ivfpq'):
+            nprobe = faiss.extract_index_ivf(self.index).nprobe
+            return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe), selector
+        if self.index_type == 'hnsw':
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=self._hnsw().hnsw.efSearch), selector
+        return faiss.SearchParameters(sel=selector), selector
+
+    def _hnsw(self):
+        base = self.index
+        if isinstance(base, faiss.IndexIDMap2):
+            base = faiss.downcast_index(base.index)
+        return base
+
+    def _live_params(self):
+        """Search parameters excluding deleted rows still in the HNSW graph, or (None, None)
+
+        The selectors are returned too: they must stay referenced while searching.
+        """
+        if self._stale_rows == 0:
+            return None, None
+        if self._dead_rows is None:
+            self._dead_rows = np.flatnonzero(~self._live_mask(np.arange(len(self.doc_ids), dtype=np.int64)))
+        dead = faiss.IDSelectorBatch(np.ascontiguousarray(self._dead_rows, dtype=np.int64))
+        selector = faiss.IDSelectorNot(dead)
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=self._hnsw().hnsw.efSearch), (selector, dead)
+
+    def _add_postings(self, metadata, start_row):
+        """Append rows start_row.. to the metadata posting lists"""
+        new = {}
+        for offset, fields in enumerate(metadata):
+            for field, value in (fields or {}).items():
+                if not _is_missing(value):
+                    new.setdefault(field, {}).setdefault(str(value), []).append(start_row + offset)
+        for field, by_value in new.items():
+            postings = self.postings.setdefault(field, {})
+            for value, rows in by_value.items():
+                rows = np.array(rows, dtype=np.int64)
+                if value in postings:
+                    rows = np.concatenate([postings[value], rows])
+                postings[value] = rows
+
+    def _save_postings(self, path):
+        """Write posting lists as one int64 array plus a JSON table of slices"""
+        table = {}
+        chunks = []
+        position = 0
+        for field, by_value in self.postings.items():
+            table[field] = {}
+            for value, rows in by_value.items():
+                rows = rows[self._live_mask(rows)]
+                if len(rows) == 0:
+                    continue
+                table[field][value] = [position, position + len(rows)]
+                chunks.append(rows)
+                position += len(rows)
+        np.save(os.path.join(path, FILTER_ROWS_FILE),
+                np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64))
+        with open(os.path.join(path, FILTER_INDEX_FILE), 'w') as f:
+            json.dump(table, f)
+
+    def _load_postings(self, path, mmap_mode):
+        with open(os.path.join(path, FILTER_INDEX_FILE)) as f:
+            table = json.load(f)
+        all_rows = np.load(os.path.join(path, FILTER_ROWS_FILE), mmap_mode=mmap_mode if table else None)
+        self.postings = {
+            field: {value: all_rows[start:end] for value, (start, end) in by_value.items()}
+            for field, by_value in table.items()
+        }
+
+    def _search_reranked(self, query_embs, top_k, params=None):
+        """Over-fetch candidates from the (compressed) index, then re-score them exactly"""
+        _, candidates = self.index.search(query_embs, top_k * self.rerank_factor, params=params)
+        D = np.full((len(query_embs), top_k), np.inf, dtype=np.float32)
+        I = np.full((len(query_embs), top_k), -1, dtype=np.int64)
+        for row, ids in enumerate(candidates):
+            ids = ids[ids >= 0]
+            if len(ids) == 0:
+                continue
+            # Sorted fancy indexing reads only the candidate rows of the memmap
+            ids = np.sort(ids)
+            dists = ((self._vectors(ids) - query_embs[row]) ** 2).sum(axis=1)
+            best = np.argsort(dists)[:top_k]
+            D[row, :len(best)] = dists[best]
+            I[row, :len(best)] = ids[best]
+        return D, I
+
+    def _rows(self):
+        """Map of live document id -> row, built on first use"""
+        if self.doc_ids is None:
+            raise ValueError("This index has no document ids; rebuild it with build_index(texts, ids).")
+        if self._row_of is None:
+            self._row_of = {doc_id: row for row, doc_id in enumerate(self.doc_ids) if doc_id}
+        return self._row_of
+
+    def _make_editable(self):
         if self.index is None:
             raise ValueError("Vector index is not loaded. Call load_index() first.")
-        query_emb = self.model.encode([query])
-        D, I = self.index.search(np.array(query_emb, dtype=np.float32), top_k)
-        return [(self.texts[i], float(D[0][idx])) for idx, i in enumerate(I[0])] 
\ No newline at end of file
+        if self._read_only:
+            raise ValueError("Index was loaded with mmap=True; reload it with mmap=False to edit.")
+        self._rows()
+        if not isinstance(self.texts, list):
+            self.texts = list(self.texts)
+            self.doc_ids = list(self.doc_ids)
+        if self.embeddings is None:
+            self.embeddings = self._exact_vectors()
+
+    def upsert(self, ids, texts, metadata=None, batch_size=None):
+        """Insert new documents or replace existing ones, re-encoding only these texts.
+
+        With batch_size the texts are encoded and added batch_size at a time.
+        """
+        ids = [str(i) for i in ids]
+        docs = dict(zip(ids, texts))
+        if not docs:
+            return
+        doc_metadata = dict(zip(ids, metadata)) if metadata is not None else {}
+        self._make_editable()
+        self.delete([doc_id for doc_id in docs if doc_id in self._row_of])
+
+        doc_ids = list(docs)
+        batch_size = batch_size or len(doc_ids)
+        for batch_start in range(0, len(doc_ids), batch_size):
+            batch_ids = doc_ids[batch_start:batch_start + batch_size]
+            new_texts = [docs[doc_id] for doc_id in batch_ids]
+            embs = self._encode(new_texts)
+            start = len(self.texts)
+            self.index.add_with_ids(embs, np.arange(start, start + len(new_texts), dtype=np.int64))
+            self.texts.extend(new_texts)
+            self.doc_ids.extend(batch_ids)
+            self._added_embeddings.append(embs)
+            for offset, doc_id in enumerate(batch_ids):
+                self._row_of[doc_id] = start + offset
+            self._add_postings([doc_metadata.get(doc_id) for doc_id in batch_ids], start)
+
+    def delete(self, ids):
+        """Remove documents by id; unknown ids are ignored"""
+        self._make_editable()
+        rows = [self._row_of.pop(str(i)) for i in ids if str(i) in self._row_of]
+        if not rows:
+            return
+        for row in rows:
+            self.doc_ids[row] = ''
+            self.texts[row] = ''
+        try:
+            self.index.remove_ids(np.array(rows, dtype=np.int64))
+        except RuntimeError:
+            # HNSW cannot remove vectors; dead rows are excluded at search time
+            self._stale_rows += len(rows)
+            if self._dead_rows is not None:
+                self._dead_rows = np.union1d(self._dead_rows, rows)
+            if self._stale_rows > self.max_stale_fraction * self.index.ntotal:
+                self.compact()
+
+    def compact(self, chunk_rows=65536):
+        """Rebuild the HNSW graph from live rows only; row numbers do not change"""
+        if self._stale_rows == 0:
+            return
+        live = np.flatnonzero(self._live_mask(np.arange(len(self.doc_ids), dtype=np.int64)))
+        index = self._create_index(np.zeros((0, self.index.d), dtype=np.float32))
+        faiss.downcast_index(index.index).hnsw.efSearch = self._hnsw().hnsw.efSearch
+        for start in range(0, len(live), chunk_rows):
+            rows = live[start:start + chunk_rows]
+            index.add_with_ids(self._vectors(rows), rows)
+        self.index = index
+        self._stale_rows = 0
+        self._dead_rows = None
+
+    def _vectors(self, rows):
+        """Exact float32 vectors of rows, from the base matrix or the blocks upserted since"""
+        rows = np.asarray(rows, dtype=np.int64)
+        base = len(self.embeddings)
+        if not self._added_embeddings or len(rows) == 0 or rows.max() < base:
+            return np.asarray(self.embeddings[rows], dtype=np.float32)
+        if len(self._added_embeddings) > 1:
+            self._added_embeddings = [np.concatenate(self._added_embeddings)]
+        added = self._added_embeddings[0]
+        vecs = np.empty((len(rows), self.embeddings.shape[1]), dtype=np.float32)
+        old = rows < base
+        vecs[old] = self.embeddings[rows[old]]
+        vecs[~old] = added[rows[~old] - base]
+        return vecs
+
+    def diff(self, ids, texts):
+        """Positions in (ids, texts) of new or changed documents, and counts of added, updated and unchanged"""
+        row_of = self._rows()
+        changed = [i for i, (doc_id, text) in enumerate(zip(ids, texts))
+                   if str(doc_id) not in row_of or self.texts[row_of[str(doc_id)]] != text]
+        added = sum(1 for i in changed if str(ids[i]) not in row_of)
+        return changed, {'added': added, 'updated': len(changed) - added, 'unchanged': len(ids) - len(changed)}
+
+    def sync(self, ids, texts, metadata=None, delete_missing=True, batch_size=None):
+        """Make the index match (ids, texts) by touching only changed documents.
+
+        With delete_missing=False documents absent from ids are kept. For
+        input too large to pass at once, collect diff() results per chunk
+        and upsert them together. Returns counts of added, updated, deleted
+        and unchanged documents.
+        """
+        ids = [str(i) for i in ids]
+        changed, stats = self.diff(ids, texts)
+        if delete_missing:
+            docs = set(ids)
+            removed = [doc_id for doc_id in self._rows() if doc_id not in docs]
+        else:
+            removed = []
+        stats['deleted'] = len(removed)
+        if removed:
+            self.delete(removed)
+        if changed:
+            self.upsert([ids[i] for i in changed], [texts[i] for i in changed],
+                        [metadata[i] for i in changed] if metadata is not None else None, batch_size)
+        return stats